@@ -1,8 +1,10 @@
 #!/bin/sh
 
 # phedex-fdt project - kill a process
-# script runs via sudo, kills a process given the input PID
+# script runs via sudo, kills a process given the input PID (negative PID
+# stands for a process group), optional signal (default 9, SIGKILL)
 
-command="kill -9 $1"
+signal=${2:-9}
+command="kill -$signal -- $1"
 echo "killing process PID $1 command: $command"
 $command
\ No newline at end of file
@@ -6,7 +6,6 @@ CleanupProcessesAction make a cleanup correct. Whenever transfer finishes or
 fails with any exception, it should be called to clean up remaining processes.
 
 """
-import time
 import Pyro4
 from fdtcplib.common.actions import Action
 from fdtcplib.common.actions import Result
@@ -42,6 +41,7 @@ class CleanupProcessesAction(Action):
         if 'apmonObj' in self.options.keys():
             self.apMon = self.options['apmonObj']
         self.waitTimeout = True
+        self.resourceUsage = None
         if 'waitTimeout' in self.options.keys():
             self.waitTimeout = self.options['waitTimeout']
 
@@ -61,13 +61,7 @@ class CleanupProcessesAction(Action):
             msg = "Executor %s has syncFlag set, wait until it is unset ..." % exe
             self.lastMessage = msg
             self.logger.debug(msg)
-            while True:
-                time.sleep(0.3)
-                if not exe.syncFlag:
-                    break
-                msg = "Executor %s has syncFlag still set, loop wait." % exe
-                self.lastMessage = msg
-                self.logger.debug(msg)
+            exe.waitSyncFlag()
             msg = "Executor %s has syncFlag not set anymore, continue." % exe
             self.lastMessage = msg
             self.logger.debug(msg)
@@ -83,6 +77,10 @@ class CleanupProcessesAction(Action):
         self.status = 0
         rObj.msg = ("No errors caught during processing %s" %
                     self.__class__.__name__)
+        # final numbers of the process cleaned up
+        if exe:
+            self.resourceUsage = exe.getResourceUsage()
+            rObj.resourceUsage = self.resourceUsage
         return rObj
 
     def getID(self):
@@ -109,6 +107,22 @@ class CleanupProcessesAction(Action):
         """Returns server port on which it is listening"""
         raise CleanupProcessException('CleanUp process does not have getServerPort method call.')
 
+    def getResourceUsage(self):
+        """ Returns resources used by the process cleaned up, None if there was none """
+        return self.resourceUsage
+
+    def getReply(self):
+        """
+        Returns plain (serializable) result of the clean up, fdtd replies
+        with it rather than with a proxy, the transfer is over and nothing
+        is called on the action afterwards.
+        """
+        return dict(id=self.id,
+                    status=self.status,
+                    host=self.getHost(),
+                    msg=self.lastMessage,
+                    resourceUsage=self.resourceUsage)
+
     def executeWithLogOut(self):
         """ Execute transfer which will log everything back to calling client """
         raise CleanupProcessException('CleanUp process does not have executeWithLogOut method call.')
@@ -116,3 +130,7 @@ class CleanupProcessesAction(Action):
     def executeWithOutLogOut(self):
         """ Execute without log output to the client on the fly. Logs can be received from getLog """
         raise CleanupProcessException('CleanUp process does not have executeWithOutLogOut method call.')
+
+    def pollLogOut(self):
+        """ Returns log output available now, does not block """
+        raise CleanupProcessException('CleanUp process does not have pollLogOut method call.')
@@ -4,7 +4,8 @@ Classes holding details of communication transmitted between fdtcp and fdtd.
 Implementations of actions - factual starting of FDT Java client/server
     processes by fdtd
 
-ReceivingServerAction starts FDT process for further communication.
+ReceivingServerAction starts FDT process for further communication (or
+takes one already running from the fdtd warm pool).
 SendingClientAction will connect to this FDT process and will transmit data.
 
 """
@@ -93,39 +94,31 @@ class ReceivingServerAction(Action):
         if not match:
             self.logger.debug("Error message '%s' not found, different failure.")
             return FDTDException, exMsg
-        self.logger.debug("'%s' problem detected, analyzing running "
-                          "processes ..." % errMsg)
+        self.logger.debug("'%s' problem detected, looking up owners of "
+                          "the port ..." % errMsg)
         startTime = datetime.datetime.now()
         found = False
-        procs = psutil.pids()
-        self.logger.debug("Going to check %s processes ..." % len(procs))
-        for pid in procs:
-            try:
-                proc = psutil.Process(pid)
-                conns = proc.connections()
-            except psutil.AccessDenied:
-                self.logger.debug("Access denied to process PID: %s, "
-                                  "continue ..." % pid)
-                continue
-            for conn in conns:
-                # It can have multiple connections, so need to check all
+        for pid, state in self.caller.getPortOwners(self.port):
+            found = True
+            if pid is None:
+                msg = ("Detected: socket in state %s occupies port: %s "
+                       "(no owner process)" % (state, self.port))
+            else:
                 try:
-                    connPort = int(conn.local_address[1])
-                    if self.port == connPort:
-                        msg = ("Detected: process PID: %s occupies port: %s "
-                               "(user: %s, cmdline: %s)" %
-                               (pid, self.port, proc.username, " ".join(proc.cmdline)))
-                        self.logger.debug(msg)
-                        exMsg += msg
-                        found = True
-                except AttributeError as ex:
-                    self.logger.debug("Got unnexpected attribute error. %s %s" % (conn, ex))
-                    continue
-            if found:
-                return PortInUseException, exMsg
+                    proc = psutil.Process(pid)
+                    user, cmdline = proc.username(), " ".join(proc.cmdline())
+                except psutil.Error:
+                    user = cmdline = "<unknown>"
+                msg = ("Detected: process PID: %s occupies port: %s "
+                       "(state: %s, user: %s, cmdline: %s)" %
+                       (pid, self.port, state, user, cmdline))
+            self.logger.debug(msg)
+            exMsg += msg
         endTime = datetime.datetime.now()
         elapsed = old_div(((endTime - startTime).microseconds), 1000)
-        self.logger.debug("Process checking is over, took %s ms." % elapsed)
+        self.logger.debug("Port owners lookup is over, took %s ms." % elapsed)
+        if found:
+            return PortInUseException, exMsg
         return FDTDException, exMsg
 
     def execute(self):
@@ -135,6 +128,8 @@ class ReceivingServerAction(Action):
         happen here.
         """
         startTime = datetime.datetime.now()
+        if self._takeWarmServer():
+            return self._respond("FDT server is running (warm pool)", "", startTime)
         # may fail with subset of FDTDException which will be propagated
         if 'portServer' in self.options and self.options['portServer']:
             self.logger.info("Forcing to use user specified port %s" % self.options['portServer'])
@@ -154,12 +149,24 @@ class ReceivingServerAction(Action):
         self.logger.debug("Results:\n%s" % self._checkTargetFileNames(destFiles))
         user = self.options["sudouser"]
         self.logger.debug("Local grid user is '%s'" % user)
+        killTimeout = self.conf.get("fdtReceivingServerKillTimeout")
+        # the server is ready once it logs it's listening
+        toWaitFor = self.conf.get("fdtServerLogOutputToWaitFor") % dict(port=self.port)
+        waitTime = self.conf.get("fdtServerLogOutputTimeout")
         self.executor = Executor(self.id,
                                  caller=self.caller,
                                  command=self.command,
                                  port=self.port,
                                  userName=user,
-                                 logger=self.logger)
+                                 logger=self.logger,
+                                 killTimeout=killTimeout,
+                                 logOutputToWaitFor=toWaitFor,
+                                 logOutputWaitTime=int(waitTime),
+                                 outputBufferSize=int(self.conf.get("outputBufferSize") or 65536),
+                                 backend=self.conf.get("executorBackend") or "select",
+                                 placement=self.caller.getPlacement("receiver"),
+                                 resourceSampleInterval=int(
+                                     self.conf.get("resourceSampleInterval") or 0))
         try:
             output = self.executor.execute()
         # on errors, do not do any cleanup or port releasing, from
@@ -167,29 +174,71 @@ class ReceivingServerAction(Action):
         # be handled by CleanupProcessesAction
         except Exception as ex:
             raiser, ex = self._checkAddrAlreadyInUseError(str(ex))
+            if raiser is PortInUseException:
+                # do not hand out the port again until it is freed
+                self.caller.quarantinePort(self.port)
             msg = ("Could not start FDT server on %s port: %s, reason: %s" %
                    (getHostName(), self.port, ex))
             self.logger.critical(msg, traceBack=True)
             self.status = -2
             raise raiser(msg)
         else:
-            rObj = Result(self.id)
-            rObj.status = 0
-            self.status = 0
-            # port on which FDT Java server runs
-            rObj.serverPort = self.port
-            rObj.msg = "FDT server is running"
-            rObj.log = output
-            self.logger.debug("Response to client: %s" % rObj)
-
-            endTime = datetime.datetime.now()
-            elapsed = (endTime - startTime).seconds
-            par = dict(id=self.id, fdt_server_init=elapsed)
-            self.logger.debug("Starting FDT server lasted: %s [s]." % elapsed)
-            if self.apMon:
-                self.logger.debug("Sending data to ApMon ...")
-                self.apMon.sendParameters("fdtd_server_writer", None, par)
-            return rObj
+            return self._respond("FDT server is running", output, startTime,
+                                 readyTime=self.executor.readyTime)
+
+    def _respond(self, msg, output, startTime, readyTime=None):
+        """ Result of the request on a running FDT Java server """
+        rObj = Result(self.id)
+        rObj.status = 0
+        self.status = 0
+        # port on which FDT Java server runs
+        rObj.serverPort = self.port
+        rObj.msg = msg
+        rObj.log = output
+        rObj.resourceUsage = self.executor.getResourceUsage()
+        self.logger.debug("Response to client: %s" % rObj)
+
+        endTime = datetime.datetime.now()
+        elapsed = (endTime - startTime).seconds
+        par = dict(id=self.id, fdt_server_init=elapsed)
+        self.logger.debug("Starting FDT server lasted: %s [s]." % elapsed)
+        if readyTime is not None:
+            # since the process start until FDT Java server listens
+            par["fdt_server_ready"] = readyTime
+            self.logger.debug("FDT server ready (listening) in %.3f [s]." %
+                              readyTime)
+        if self.apMon:
+            self.logger.debug("Sending data to ApMon ...")
+            self.apMon.sendParameters("fdtd_server_writer", None, par)
+        return rObj
+
+    def _takeWarmServer(self):
+        """
+        Use FDT Java server from the fdtd warm pool (started for the same
+        client IP and grid user), returns False if there is none.
+        The server was started before the request, FDT Java reports to
+        MonALISA under the pool id of the server, not the request's monID.
+        """
+        if self.options.get("warm") or self.options.get("portServer"):
+            return False
+        executor = self.caller.takeWarmServer(self.id,
+                                              self.options["clientIP"],
+                                              self.options["gridUserDest"])
+        if executor is None:
+            return False
+        # logging of the process goes with the request from now on
+        executor.logger = self.logger
+        self.executor = executor
+        self.port = executor.port
+        self.options["sudouser"] = self.options["gridUserDest"]
+        self.logger.info("Using FDT server %s from the warm pool, monitored as "
+                         "'%s' rather than '%s'." % (executor, executor.id,
+                                                     self.options.get("monID", self.id)))
+        self.logger.info("%s - checking presence of files at target "
+                         "location ..." % self.__class__.__name__)
+        self.logger.debug("Results:\n%s" %
+                          self._checkTargetFileNames(self.options["destFiles"]))
+        return True
 
     def getID(self):
         """ Returns transfer ID """
@@ -215,11 +264,19 @@ class ReceivingServerAction(Action):
         """Returns server port on which it is listening"""
         return self.port
 
+    def getResourceUsage(self):
+        """ Returns resources used by FDT Java so far (see Executor.getResourceUsage) """
+        return self.executor.getResourceUsage()
+
     def executeWithLogOut(self):
         """ Execute transfer which will log everything back to calling client """
-        for line in self.executor.executeWithLogOut():
-            yield line
+        for batch in self.executor.executeWithLogOut():
+            yield batch
 
     def executeWithOutLogOut(self):
         """ Execute without log output to the client on the fly. Logs can be received from getLog """
         return self.executor.executeWithOutLogOut()
+
+    def pollLogOut(self):
+        """ Returns log output available now, does not block (see Executor.pollLogOut) """
+        return self.executor.pollLogOut()
@@ -91,7 +91,13 @@ class SendingClientAction(Action):
                                  self.command,
                                  caller=self.caller,
                                  userName=localGridUser,
-                                 logger=self.logger)
+                                 logger=self.logger,
+                                 killTimeout=killTimeout,
+                                 outputBufferSize=int(self.conf.get("outputBufferSize") or 65536),
+                                 backend=self.conf.get("executorBackend") or "select",
+                                 placement=self.caller.getPlacement("sender"),
+                                 resourceSampleInterval=int(
+                                     self.conf.get("resourceSampleInterval") or 0))
         try:
             try:
                 output = self.executor.execute()
@@ -112,13 +118,14 @@ class SendingClientAction(Action):
                 self.status = 0
                 rObj.log = output
                 rObj.msg = "Output from FDT client"
+                rObj.resourceUsage = self.executor.getResourceUsage()
                 self.logger.debug("FDT client log (as sent to "
                                   "fdtcp):\n%s" % output)
                 return rObj
         finally:
             # give signal on this actions Executor instance that its handling
             # finished (e.g. CleanupProcessesAction may be waiting for this)
-            self.executor.syncFlag = False
+            self.executor.setSyncFlag(False)
 
     def getID(self):
         """ Returns transfer ID """
@@ -145,12 +152,20 @@ class SendingClientAction(Action):
         raise NotImplementedError("Sending client does not provide port info.")
         # This behaviour might change whenever we do pull mode.
 
+    def getResourceUsage(self):
+        """ Returns resources used by FDT Java so far (see Executor.getResourceUsage) """
+        return self.executor.getResourceUsage()
+
     def executeWithLogOut(self):
         """ Execute transfer and yield log out to the client """
-        for line in self.executor.executeWithLogOut():
-            print(line, end='')
-            yield line
+        # batches of output lines, logged by the executor
+        for batch in self.executor.executeWithLogOut():
+            yield batch
 
     def executeWithOutLogOut(self):
         """ Execute without log output to the client on the fly. Logs can be received from getLog """
         return self.executor.executeWithOutLogOut()
+
+    def pollLogOut(self):
+        """ Returns log output available now, does not block (see Executor.pollLogOut) """
+        return self.executor.pollLogOut()
@@ -0,0 +1,70 @@
+"""
+Classes holding details of communication transmitted between fdtcp and fdtd.
+
+StatFilesAction returns sizes of the files to be sent, fdtcp uses them
+to split a large group transfer into several FDT sessions balanced
+by bytes. Only sizes are returned, nothing is started at fdtd.
+fdtd stats the files with its own privileges, so only files under the
+configured statFilesPrefixes are stat'ed and at most statFilesMaxFiles
+of them per request, sizes of the others are unknown.
+
+"""
+import os
+import Pyro4
+from fdtcplib.common.actions import Action
+
+
+@Pyro4.expose
+class StatFilesAction(Action):
+    """ Sizes of the files at the fdtd host """
+
+    def __init__(self, options):
+        self.id = options['id']
+        Action.__init__(self, self.id, options.get('timeout'))
+        self.files = options['files']
+        self.logger = options['logger']
+        conf = options.get('conf') or {}
+        # directories (resolved) whose files may be stat'ed
+        self.prefixes = [os.path.join(os.path.realpath(prefix.strip()), "")
+                         for prefix in (conf.get("statFilesPrefixes") or "").split(",")
+                         if prefix.strip()]
+        self.maxFiles = int(conf.get("statFilesMaxFiles") or 10000)
+        self.status = -1
+        # file name -> size in bytes, None if the file can't be stat'ed
+        self.sizes = {}
+
+    def isAllowed(self, fileName):
+        """ Returns True if fileName is under one of the allowed prefixes """
+        realName = os.path.realpath(fileName)
+        return any(realName.startswith(prefix) for prefix in self.prefixes)
+
+    def execute(self):
+        """ Stat all files, a failure on a file is not an error of the action """
+        if len(self.files) > self.maxFiles:
+            self.logger.warn("%s files requested, only the first %s are stat'ed." %
+                             (len(self.files), self.maxFiles))
+        for index, fileName in enumerate(self.files):
+            self.sizes[fileName] = None
+            if index >= self.maxFiles:
+                continue
+            if not self.isAllowed(fileName):
+                self.logger.debug("Not stat'ing '%s', not under statFilesPrefixes." %
+                                  fileName)
+                continue
+            try:
+                self.sizes[fileName] = os.stat(fileName).st_size
+            except OSError as ex:
+                self.logger.debug("Can't stat '%s', reason: %s" % (fileName, ex))
+        self.status = 0
+
+    def getSizes(self):
+        """ Returns file name -> size (None if unknown) dictionary """
+        return self.sizes
+
+    def getID(self):
+        """ Returns transfer ID """
+        return self.id
+
+    def getStatus(self):
+        """ Returns class status """
+        return self.status
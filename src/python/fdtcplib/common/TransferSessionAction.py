@@ -0,0 +1,99 @@
+"""
+Classes holding details of communication transmitted between fdtcp and fdtd.
+
+TransferSessionAction starts one side of the transfer in a single round trip.
+There is no preceding TestAction, the liveness check of fdtd is folded into
+the call which starts the work: role 'receiver' starts FDT Java server
+(ReceivingServerAction), role 'sender' starts FDT Java client
+(SendingClientAction). fdtd replies with the session details (see
+getSession()) rather than with the action proxy, so fdtcp does not need
+further calls to learn the status or port of the FDT server.
+
+"""
+import Pyro4
+from fdtcplib.common.actions import Action
+from fdtcplib.common.ReceivingServerAction import ReceivingServerAction
+from fdtcplib.common.SendingClientAction import SendingClientAction
+from fdtcplib.common.errors import FDTDException
+
+
+@Pyro4.expose
+class TransferSessionAction(Action):
+    """ Receiving server or sending client started in one call """
+
+    def __init__(self, options):
+        """
+        options are the same as for the wrapped action plus 'role'
+        which is either 'receiver' or 'sender'.
+        """
+        self.id = options['transferId']
+        Action.__init__(self, self.id)
+        self.options = options
+        self.role = options.get('role')
+        if self.role == 'receiver':
+            self.action = ReceivingServerAction(options)
+        elif self.role == 'sender':
+            self.action = SendingClientAction(options)
+        else:
+            raise FDTDException("Unknown transfer session role '%s'." % self.role)
+
+    def execute(self):
+        """ Start FDT Java server / client, exceptions are propagated to fdtcp """
+        return self.action.execute()
+
+    def getSession(self, uri):
+        """
+        Returns plain (serializable) details of the started session, uri is
+        the PYRO URI under which this action is registered with fdtd, fdtcp
+        uses it for following the transfer and for the logs.
+        """
+        session = dict(id=self.id,
+                       role=self.role,
+                       status=self.action.getStatus(),
+                       host=self.action.getHost(),
+                       serverPort=None,
+                       uri=str(uri))
+        if self.role == 'receiver':
+            session['serverPort'] = self.action.getServerPort()
+        return session
+
+    def getID(self):
+        """ Returns transfer ID """
+        return self.id
+
+    def getStatus(self):
+        """ Returns class status """
+        return self.action.getStatus()
+
+    def getHost(self):
+        """ Returns hostname. """
+        return self.action.getHost()
+
+    def getMsg(self):
+        """ Returns last raised message in the queue """
+        return self.action.getMsg()
+
+    def getLog(self):
+        """ Returns log file lines """
+        return self.action.getLog()
+
+    def getServerPort(self):
+        """Returns server port on which it is listening"""
+        return self.action.getServerPort()
+
+    def getResourceUsage(self):
+        """ Returns resources used by FDT Java so far (see Executor.getResourceUsage) """
+        return self.action.getResourceUsage()
+
+    def executeWithLogOut(self):
+        """ Execute transfer which will log everything back to calling client """
+        for batch in self.action.executeWithLogOut():
+            yield batch
+
+    def executeWithOutLogOut(self):
+        """ Execute without log output to the client on the fly. Logs can be received from getLog """
+        return self.action.executeWithOutLogOut()
+
+    def pollLogOut(self):
+        """ Returns log output available now, does not block (see Executor.pollLogOut) """
+        return self.action.pollLogOut()
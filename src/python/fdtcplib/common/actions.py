@@ -177,6 +177,9 @@ class Result(CarrierBase):
         self.status = None
         self.host = getHostName()
         self.serverPort = None
+        # resources used by the process of the action (see
+        # fdtcplib.utils.ResourceUsage), dict or None
+        self.resourceUsage = None
 
     def __str__(self):
         className = self.__class__.__name__
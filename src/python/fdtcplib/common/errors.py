@@ -1,4 +1,5 @@
 """ Custom FDTCP Exceptions """
+from Pyro4.util import SerializerBase
 
 
 class TimeoutException(Exception):
@@ -68,3 +69,20 @@ class CleanupProcessException(FDTDException):
     Exception in Cleanup Process - Failed to clean process or called non existing method.
     """
     pass
+
+
+class ServiceBusyException(FDTDException):
+    """
+    fdtd is at its admission limits, request refused, it may be repeated
+    after retryAfter seconds.
+    """
+    def __init__(self, msg, retryAfter=None):
+        FDTDException.__init__(self, msg)
+        self.retryAfter = retryAfter
+
+
+# remote exceptions arrive as instances of their classes only if
+# registered with the PYRO serializer (fdtcp side)
+SerializerBase.register_dict_to_class(
+    "%s.%s" % (__name__, ServiceBusyException.__name__),
+    lambda dummyClassName, data: SerializerBase.make_exception(ServiceBusyException, data))
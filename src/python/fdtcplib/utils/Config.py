@@ -169,6 +169,22 @@ class Config(object):
         # if not defined - return None
         return val
 
+    def _sanitizeOptionalInt(self, opt, default, minimum):
+        """ Convert optional integer value, set default if not defined """
+        val = self.get(opt)
+        if val is None:
+            self.options[opt] = default
+            return
+        try:
+            self.options[opt] = int(val)
+        except (ValueError, TypeError):
+            msg = ("Illegal option '%s', expecting integer, got '%s'" %
+                   (opt, val))
+            raise ConfigurationException(msg)
+        if self.options[opt] < minimum:
+            msg = "Illegal option '%s', must be at least %s, got '%s'" % (opt, minimum, val)
+            raise ConfigurationException(msg)
+
     def sanitize(self):
         """
         Checks that all mandatory configuration values are present and
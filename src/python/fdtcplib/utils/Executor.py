@@ -3,15 +3,40 @@ Component for running external commands.
 Possibility to associate ID with the command (job) and username (running
 processes under arbitrary usernames).
 
-Handling standard output, standard error streams.
+Handling standard output, standard error streams. Output is read either
+by the thread which consumes it (backend 'select') or, for all processes,
+by the single OutputSupervisor thread (backend 'supervisor'). Output
+nobody consumes (a server once it's ready, a process waited for without
+its output) is always read by OutputSupervisor.
 """
 from __future__ import print_function
+import os
+import time
+import collections
 import subprocess
 import select
 import logging
+import threading
 from fdtcplib.common.errors import ExecutorException
 from fdtcplib.utils.Logger import Logger
 from fdtcplib.utils.utils import debugDetails
+from fdtcplib.utils.ProcessReaper import getReaper
+from fdtcplib.utils.OutputBuffer import OutputBuffer
+from fdtcplib.utils.OutputSupervisor import getSupervisor
+from fdtcplib.utils.ResourceUsage import ResourceAccount, getMonitor
+
+
+# executeWithLogOut() sends output lines in batches, a batch is sent once
+# it's BATCH_INTERVAL seconds old or holds BATCH_SIZE bytes of output
+BATCH_INTERVAL = 0.2
+BATCH_SIZE = 65536
+# output lines read but not taken by a consumer yet are discarded (the
+# oldest first) over this size, they're still in the output buffers
+MAX_PENDING_SIZE = 1048576
+# 'select' - output is read by the thread consuming it (executeWithLogOut(),
+# pollLogOut()) until nobody consumes it, see _handOver(), 'supervisor' -
+# by OutputSupervisor as soon as it comes
+BACKENDS = ("select", "supervisor")
 
 
 class Executor(object):
@@ -20,7 +45,10 @@ class Executor(object):
     """
 
     def __init__(self, idE, command, caller=None, port=None,
-                 userName=None, logger=None):
+                 userName=None, logger=None, killTimeout=0,
+                 logOutputToWaitFor=None, logOutputWaitTime=0,
+                 outputBufferSize=65536, backend="select", placement=None,
+                 resourceSampleInterval=0):
         # id of the associated action / request
         self.id = idE
         # actual command to execute in the process
@@ -37,6 +65,26 @@ class Executor(object):
         # process (i.e. of this Executor) - needed when killing this process,
         # default None means the same user who runs the main script
         self.userName = userName
+        # time [s] given to the process to finish on its own when it's
+        # being cleaned up before it gets killed
+        self.killTimeout = killTimeout
+        # execute() returns once this string appears in the output of the
+        # process (e.g. a server is listening), waits at most
+        # logOutputWaitTime seconds, then the process is considered running
+        self.logOutputToWaitFor = logOutputToWaitFor
+        self.logOutputWaitTime = logOutputWaitTime
+        # time [s] from the process start until logOutputToWaitFor appeared
+        self.readyTime = None
+        # how the output is read, see BACKENDS
+        if backend not in BACKENDS:
+            raise ExecutorException("Unknown Executor backend '%s'" % backend)
+        self.backend = backend
+        # CPU, NUMA and I/O priority placement of the process (Placement)
+        self.placement = placement
+        # resources used by the process (group), sampled every
+        # resourceSampleInterval seconds (0 - only at exit)
+        self.resourceSampleInterval = resourceSampleInterval
+        self.resourceAccount = None
 
         self.logger = logger or Logger(name="Executor", level=logging.DEBUG)
 
@@ -45,6 +93,24 @@ class Executor(object):
         self.proc = None
         # returncode from the underlying self.proc instance
         self.returncode = None
+        # output read so far but not ended by a new line yet, None once
+        # the stream reached EOF
+        self.partialLines = {"STDOUT": "", "STDERR": ""}
+        # output lines ({stream name: line}) read, not taken by
+        # _readOutput() yet, and their size
+        self.pendingOutput = collections.deque()
+        self.pendingSize = 0
+        self.numDiscardedLines = 0
+        # guards the above, notified when output is read
+        self.outputCond = threading.Condition()
+        # tail of the output of the process (as read by _readOutput()),
+        # at most outputBufferSize bytes of each stream, see getLogs()
+        self.outputBuffers = {"STDOUT": OutputBuffer(outputBufferSize),
+                              "STDERR": OutputBuffer(outputBufferSize)}
+        # set while output of the process is being pushed to the client
+        # (executeWithLogOut()), cleanup waits until it's unset
+        self.syncFlag = False
+        self.syncCond = threading.Condition()
 
     def __str__(self):
         if self.proc:
@@ -54,21 +120,28 @@ class Executor(object):
         return "process PID: %s '%s' id:'%s'" % (pid, self.command, self.id)
 
     def getLogs(self):
-        """ Gets all log lines from the log file which is assigned to the PID and
-            same as transferID"""
-        return ""
-        # TODO. This has to be fixed now, as logs are pushed directly to client
+        """
+        Returns the most recent output of the process (outputBufferSize
+        bytes of stdout and stderr at most) which has been read so far.
+        """
+        separator = 78 * "-"
+        logs = [separator]
+        for name in ("STDOUT", "STDERR"):
+            logs.extend(["%s:" % name.lower(), str(self.outputBuffers[name]),
+                         separator])
+        return "\n".join(logs)
 
     def executeWithOutLogOut(self):
         """ This will block and will wait until following subprocess finishes.
             There is no separation on debug and info and all messages will be returned."""
         msg = "Waiting for '%s' (PID: %s) to finish ..." % (self.command,
                                                             self.proc.pid)
+        self._handOver()
         self.logger.info(msg)
         self.lastMessage = msg
         # waits here
         try:
-            self.returncode = self.proc.wait()
+            self.returncode = self.wait()
         except OSError as ex:
             msg = "Waiting for process to complete failed (crashed/killed?), reason: %s" % ex
             self.logger.error(msg)
@@ -102,36 +175,268 @@ class Executor(object):
     def executeWithLogOut(self):
         """ execute and also push log back to the calling client.
             Separately it will return stdout and stderr. In case -v is used at
-            client end, both messages will be printed."""
+            client end, both messages will be printed.
+            Yields batches (lists) of output items, as returned by
+            pollLogOut(), rather than single lines (a call back to the
+            client each)."""
+        self.setSyncFlag(True)
+        try:
+            for out in self._executeWithLogOut():
+                yield out
+        finally:
+            self.setSyncFlag(False)
+
+    def _executeWithLogOut(self):
+        """
+        Batches of executeWithLogOut(). Waits for some output, then
+        collects further output for at most BATCH_INTERVAL seconds or
+        until BATCH_SIZE bytes were read. Partial lines are not waited
+        for, the pipes are read as the output comes.
+        """
         while True:
-            reads = [self.proc.stdout.fileno(), self.proc.stderr.fileno()]
-            ret = select.select(reads, [], [])
-            for fd in ret[0]:
-                nextLine = ""
-                if fd == self.proc.stdout.fileno():
-                    nextLine = self.proc.stdout.readline()
-                    self.logger.debug(nextLine)
-                    yield {"STDOUT": nextLine}
-                if fd == self.proc.stderr.fileno():
-                    nextLine = self.proc.stderr.readline()
-                    self.logger.debug(nextLine)
-                    yield {"STDERR": nextLine}
-            if self.proc.poll() is not None:
-                break
-        output = self.proc.communicate()[0]
-        exitCode = self.proc.returncode
+            batch = self._readOutput(timeout=None, maxSize=BATCH_SIZE)
+            size = sum([len(line) for item in batch for line in item.values()])
+            deadline = time.time() + BATCH_INTERVAL
+            while size < BATCH_SIZE and not self._outputFinished():
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                out = self._readOutput(remaining, maxSize=BATCH_SIZE - size)
+                size += sum([len(line) for item in out for line in item.values()])
+                batch.extend(out)
+            for item in batch:
+                self.logger.debug("".join(item.values()).rstrip("\n"))
+            if self._outputFinished():
+                batch.append(self._finalItem())
+                yield batch
+                return
+            if batch:
+                yield batch
+
+    def _finalItem(self):
+        """ Output item with the outcome of the finished process """
+        exitCode = self.wait()
         if exitCode == 0:
-            yield {"ReturnCode": exitCode, "Status": "SUCCESS"}
-        else:
-            yield {"ReturnCode": exitCode, "Status": "FAILED", "OUTPUT": output}
+            return {"ReturnCode": exitCode, "Status": "SUCCESS",
+                    "ResourceUsage": self.getResourceUsage()}
+        return {"ReturnCode": exitCode, "Status": "FAILED", "OUTPUT": "",
+                "ResourceUsage": self.getResourceUsage()}
+
+    def _readOutput(self, timeout=0, maxSize=None):
+        """
+        Returns list of output lines ({stream name: line}) available now,
+        waits at most timeout seconds (None - no limit) for some output.
+        Returns about maxSize bytes at most (None - no limit).
+        """
+        if self.backend == "select":
+            self._selectOutput(timeout, maxSize)
+            timeout = 0
+        return self._takeOutput(timeout, maxSize)
+
+    def _selectOutput(self, timeout, maxSize):
+        """
+        Reads the pipes (backend 'select'), waits at most timeout seconds
+        for some output, stops after about maxSize bytes.
+        """
+        size = 0
+        streams = {"STDOUT": self.proc.stdout, "STDERR": self.proc.stderr}
+        while True:
+            reads = [streams[name].fileno() for name in streams
+                     if self.partialLines[name] is not None]
+            if not reads:
+                break
+            if maxSize is not None and size >= maxSize:
+                break
+            ready = select.select(reads, [], [], timeout)[0]
+            timeout = 0
+            if not ready:
+                break
+            for name, stream in streams.items():
+                if stream.fileno() in ready:
+                    data = os.read(stream.fileno(), 65536)
+                    size += len(data)
+                    self._received(name, data)
+
+    def _received(self, name, data):
+        """
+        Output data read from the stream (empty at EOF): kept in the
+        output buffer and split into lines pending for _readOutput().
+        Called by the reading thread (consumer or OutputSupervisor).
+        """
+        with self.outputCond:
+            if data:
+                self.outputBuffers[name].append(data)
+                lines = (self.partialLines[name] + data).split("\n")
+                self.partialLines[name] = lines.pop()
+                items = [{name: line + "\n"} for line in lines]
+            else:
+                # EOF, pass on what remained without new line
+                items = []
+                if self.partialLines[name]:
+                    items.append({name: self.partialLines[name]})
+                self.partialLines[name] = None
+            for item in items:
+                self.pendingOutput.append(item)
+                self.pendingSize += len(item[name])
+            # nobody takes the output (e.g. a server after its start up)
+            while self.pendingSize > MAX_PENDING_SIZE:
+                item = self.pendingOutput.popleft()
+                self.pendingSize -= sum([len(line) for line in item.values()])
+                self.numDiscardedLines += 1
+            self.outputCond.notify_all()
+
+    def _takeOutput(self, timeout, maxSize):
+        """
+        Takes pending output lines, about maxSize bytes at most, waits at
+        most timeout seconds (None - no limit) for some.
+        """
+        with self.outputCond:
+            deadline = None if timeout is None else time.time() + timeout
+            while not self.pendingOutput and not self._outputFinished():
+                # in periods, Condition.wait() without timeout can't be interrupted
+                remaining = 60 if deadline is None else deadline - time.time()
+                if remaining <= 0:
+                    break
+                self.outputCond.wait(remaining)
+            out = []
+            size = 0
+            while self.pendingOutput and (maxSize is None or size < maxSize):
+                item = self.pendingOutput.popleft()
+                size += sum([len(line) for line in item.values()])
+                out.append(item)
+            self.pendingSize -= size
+            return out
+
+    def _outputFinished(self):
+        """
+        True once both output streams of the process reached EOF and all
+        the output lines were taken
+        """
+        with self.outputCond:
+            return (not self.pendingOutput and
+                    all(partial is None for partial in self.partialLines.values()))
+
+    def pollLogOut(self):
+        """
+        Non-blocking counterpart of executeWithLogOut(): returns list of
+        output lines available right now (items as yielded by
+        executeWithLogOut()), the last item carries ReturnCode and Status
+        once the process finished and all its output was returned.
+        """
+        out = self._readOutput()
+        if self._outputFinished():
+            out.append(self._finalItem())
+        return out
+
+    def _waitForLogOutput(self):
+        """
+        Waits until logOutputToWaitFor appears in the output of the process,
+        at most logOutputWaitTime seconds. The output is read as soon as
+        it's available. Raises ExecutorException if the process finishes
+        before. Returns the output read.
+        """
+        startTime = time.time()
+        deadline = startTime + self.logOutputWaitTime
+        output = ""
+        while True:
+            for item in self._readOutput(max(0, deadline - time.time())):
+                output += "".join(item.values())
+            with self.outputCond:
+                pending = "".join([partial for partial in self.partialLines.values()
+                                   if partial])
+            if self.logOutputToWaitFor in output + pending:
+                self.readyTime = time.time() - startTime
+                self.lastMessage = ("Command '%s' ready in %.3f [s]." %
+                                    (self.command, self.readyTime))
+                self.logger.info(self.lastMessage)
+                return output + pending
+            if self._outputFinished():
+                msg = ("Command '%s' finished (return code: '%s') before "
+                       "logging '%s', output:\n%s" %
+                       (self.command, self.wait(), self.logOutputToWaitFor,
+                        output))
+                self.lastMessage = msg
+                raise ExecutorException(msg)
+            if time.time() >= deadline:
+                msg = ("Command '%s' has not logged '%s' within %s [s], "
+                       "considered running." %
+                       (self.command, self.logOutputToWaitFor,
+                        self.logOutputWaitTime))
+                self.lastMessage = msg
+                self.logger.warn(msg)
+                return output + pending
+
+    def _handOver(self):
+        """
+        Output nobody consumes from now on is read by OutputSupervisor
+        (backend 'select'), so that getLogs() has its tail and the process
+        does not block on a full pipe. Called by the only thread reading.
+        """
+        if self.backend == "select":
+            self.backend = "supervisor"
+            getSupervisor().watch(self)
+
+    def poll(self):
+        """ Returns the return code of the process, None if it still runs """
+        return self.wait(timeout=0)
+
+    def wait(self, timeout=None):
+        """
+        Waits for the process to finish, at most timeout seconds (None
+        means no limit). Returns the return code, None if the process
+        still runs.
+        """
+        returncode = getReaper().wait(self.proc, timeout)
+        if returncode is not None:
+            self.returncode = returncode
+            if self.resourceAccount and not self.resourceAccount.endTime:
+                getMonitor().unwatch(self.resourceAccount)
+                self.resourceAccount.finish(getattr(self.proc, "rusage", None))
+        return returncode
+
+    def getResourceUsage(self):
+        """
+        Returns dict of resources used by the process (see ResourceAccount),
+        the final numbers once it finished, None if it has not started.
+        """
+        if self.resourceAccount is None:
+            return None
+        self.poll()
+        return self.resourceAccount.getUsage()
+
+    def setSyncFlag(self, value):
+        """ Set / unset syncFlag, wakes up threads waiting for it """
+        with self.syncCond:
+            self.syncFlag = value
+            self.syncCond.notify_all()
+
+    def waitSyncFlag(self, timeout=None):
+        """
+        Waits until syncFlag is unset, at most timeout seconds (None means
+        no limit). Returns True if it's unset.
+        """
+        with self.syncCond:
+            deadline = None if timeout is None else time.time() + timeout
+            while self.syncFlag:
+                remaining = 60 if deadline is None else deadline - time.time()
+                if remaining <= 0:
+                    break
+                self.syncCond.wait(remaining)
+            return not self.syncFlag
 
     def retlastMessage(self):
         """Returns last message which is stored for raising"""
         return self.lastMessage
 
+    def _preexec(self):
+        """ Runs in the child process before the command is executed """
+        # the process is a leader of its own session and process group,
+        # it's terminated together with its children (e.g. sudo, FDT Java)
+        os.setsid()
+
     def execute(self):
         """ Prepare Executor. Client has to call either with log or without log."""
-        self.logger.debug("Executing:\n%s" % debugDetails())
+        self.logger.debug("Executing:\n%s" % debugDetails(self))
 
         # sanity check - if process of the current action id is not
         # already present in the caller's executor container
@@ -146,11 +451,15 @@ class Executor(object):
                 self.lastMessage = msg
                 raise ExecutorException(msg)
 
+        if self.placement:
+            self.command = self.placement.wrapCommand(self.command)
+            self.logger.debug("Placement of '%s': %s" % (self.command, self.placement))
         # subprocess.Popen() requires arguments in a sequence, if run
         # with shell=True argument then could take the whole string
         try:
             self.proc = subprocess.Popen(self.command.split(), stdout=subprocess.PIPE,
-                                         stderr=subprocess.PIPE, universal_newlines=True)
+                                         stderr=subprocess.PIPE, universal_newlines=True,
+                                         preexec_fn=self._preexec)
         except OSError as ex:
             # logs should be available
             logs = self.getLogs()
@@ -158,7 +467,21 @@ class Executor(object):
                    "%s\nlogs:\n%s" % (self.command, ex, logs))
             self.lastMessage = msg
             raise ExecutorException(msg)
+        # its exit is collected by the process reaper, waiting for it
+        # does not poll
+        getReaper().watch(self.proc)
+        # the process leads its process group, see _preexec()
+        self.resourceAccount = ResourceAccount(self.proc.pid,
+                                               self.resourceSampleInterval)
+        getMonitor().watch(self.resourceAccount)
+        if self.backend == "supervisor":
+            getSupervisor().watch(self)
         # register newly created process with the caller, even if it fails
         # so that subsequent CleanupProcesses action knows about it
         if self.caller is not None:
             self.caller.addExecutor(self)
+        if self.logOutputToWaitFor:
+            output = self._waitForLogOutput()
+            # a server runs on its own from now on
+            self._handOver()
+            return output
@@ -0,0 +1,94 @@
+"""
+Follows output of FDT Java client (sender) and finds out the outcome
+of each file of the FDT session.
+
+FDT Java reports each file it sent by its file session (FileReaderSession
+with the file name and size) and problems with a particular file by lines
+quoting the file name (e.g. "No such file: /path"), the final return code
+concerns the whole session. A file is considered failed if an error line
+quotes it. If FDT Java succeeded, the other files are transferred. If it
+failed, only the files whose completion was reported are considered
+transferred, the outcome of the others is unknown and they are failed.
+"""
+import re
+
+
+# error lines concerning a file
+FILE_ERROR_PATTERNS = [re.compile(r"No such file: (?P<file>\S+)"),
+                       re.compile(r"The specified name \[ (?P<file>.+?) \] is not a file")]
+# file quoted by other error lines (string representation of FileSession)
+FILE_PATTERN = re.compile(r"file=(?P<file>[^,\]\s]+)")
+# completion of a file, FileReaderSession [file=/path, partitionID=0,
+# sessionID=..., sessionSize=1024]
+FILE_DONE_PATTERN = re.compile(r"FileReaderSession \[file=(?P<file>[^,]+),.*sessionSize=(?P<size>[0-9]+)")
+ERROR_PATTERN = re.compile(r"exception|error|cannot|unable|not ok", re.IGNORECASE)
+# handled problems which do not concern the transfer and summaries
+# of the session outcome (which follow the lines with the causes)
+IGNORED_PATTERN = re.compile(r"\[ HANDLED \]|Exit Status|finished with error")
+# number of error lines kept as the log of a failed session
+ERROR_LINES_KEPT = 5
+
+
+class FDTOutputParser(object):
+    """ Fed with output lines of FDT Java client of a session """
+
+    def __init__(self, files):
+        # source file names of the session
+        self.files = set(files)
+        # file -> size in bytes of files whose completion FDT Java reported
+        self.sizes = {}
+        # file -> first error line quoting the file
+        self.errors = {}
+        # error lines not attributed to any file (first few)
+        self.otherErrors = []
+        self.numOtherErrors = 0
+
+    def _findFile(self, line):
+        """ Returns known file quoted by the error line or None """
+        regm = FILE_PATTERN.search(line)
+        if regm and regm.group("file") in self.files:
+            return regm.group("file")
+        for token in line.split():
+            token = token.strip("[](),:;'\"")
+            if token in self.files:
+                return token
+        return None
+
+    def parse(self, line):
+        """ Process a line of FDT Java client output (stdout or stderr) """
+        regm = FILE_DONE_PATTERN.search(line)
+        if regm:
+            self.sizes[regm.group("file").strip()] = int(regm.group("size"))
+        for pattern in FILE_ERROR_PATTERNS:
+            regm = pattern.search(line)
+            if regm and regm.group("file") in self.files:
+                self.errors.setdefault(regm.group("file"), line.strip())
+                return
+        if not ERROR_PATTERN.search(line) or IGNORED_PATTERN.search(line):
+            return
+        fileName = self._findFile(line)
+        if fileName:
+            self.errors.setdefault(fileName, line.strip())
+        else:
+            self.numOtherErrors += 1
+            if len(self.otherErrors) < ERROR_LINES_KEPT:
+                self.otherErrors.append(line.strip())
+
+    def getResults(self, returnCode):
+        """
+        Returns file -> (result, log) for all files of the session once
+        FDT Java client finished with returnCode, result 0 means the file
+        was transferred, its log then is the size, if reported.
+        """
+        log = "FDT Java client failed, return code: %s %s" % (returnCode,
+                                                              " ".join(self.otherErrors))
+        results = {}
+        for fileName in self.files:
+            if fileName in self.errors:
+                results[fileName] = (1, self.errors[fileName])
+            elif returnCode == 0 or fileName in self.sizes:
+                size = self.sizes.get(fileName)
+                results[fileName] = (0, "size: %s [B]" % size if size is not None else "")
+            else:
+                results[fileName] = (1, log.strip())
+        return results
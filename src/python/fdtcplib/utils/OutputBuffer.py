@@ -0,0 +1,56 @@
+"""
+Bounded (ring) buffer of the most recent output of a process.
+
+Output of FDT Java is kept for reports of failures (Executor.getLogs()),
+only its tail matters and a transfer may run for hours, hence at most
+maxSize bytes are kept, the oldest output is discarded. Appending takes
+time proportional to the appended data only.
+"""
+import collections
+import threading
+
+
+class OutputBuffer(object):
+    """ Keeps the last maxSize bytes of appended data """
+
+    def __init__(self, maxSize=65536):
+        self.maxSize = maxSize
+        # chunks of data as appended, the oldest on the left
+        self.chunks = collections.deque()
+        self.size = 0
+        # number of bytes discarded so far
+        self.discarded = 0
+        self.lock = threading.Lock()
+
+    def append(self, data):
+        """ Append data, discard the oldest data over maxSize """
+        if not data:
+            return
+        with self.lock:
+            self.chunks.append(data)
+            self.size += len(data)
+            while self.size > self.maxSize:
+                excess = self.size - self.maxSize
+                oldest = self.chunks[0]
+                if len(oldest) <= excess:
+                    self.chunks.popleft()
+                    removed = len(oldest)
+                else:
+                    self.chunks[0] = oldest[excess:]
+                    removed = excess
+                self.size -= removed
+                self.discarded += removed
+
+    def getValue(self):
+        """ Returns the data kept """
+        with self.lock:
+            return "".join(self.chunks)
+
+    def __str__(self):
+        """ The data kept, preceded by a note if older data was discarded """
+        with self.lock:
+            value = "".join(self.chunks)
+            discarded = self.discarded
+        if discarded:
+            return "<%s bytes of earlier output discarded>\n%s" % (discarded, value)
+        return value
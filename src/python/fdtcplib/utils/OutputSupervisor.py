@@ -0,0 +1,107 @@
+"""
+Reading output of all child processes in a single thread.
+
+With the default Executor backend ('select'), output of a process is read
+by the thread which consumes it (e.g. a PYRO thread streaming it to
+fdtcp) and handed over to the supervisor once nobody consumes it (e.g.
+a server which is ready). The supervisor has all output pipes
+of the processes registered in one epoll set and reads whatever arrives
+into the Executor (its output buffer and pending lines), the consumers
+only wait for it. Exits of the processes are collected by the process
+reaper, fdtd thus needs two threads for any number of processes.
+Unexpected errors of the loop are logged and retried with a backoff
+(as by the process reaper), the thread never ends.
+"""
+import os
+import time
+import errno
+import select
+import logging
+import threading
+
+from fdtcplib.utils.Logger import Logger
+from fdtcplib.utils.ProcessReaper import MIN_ERROR_BACKOFF, MAX_ERROR_BACKOFF
+
+
+class OutputSupervisor(object):
+    """ Reads output pipes of registered Executors, one epoll loop """
+
+    def __init__(self, logger=None):
+        # errors only, fdtd sets its own logger (see FDTD)
+        self.logger = logger or Logger(name="OutputSupervisor", level=logging.ERROR)
+        self.epoll = None
+        # file descriptor -> (Executor, stream name)
+        self.streams = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def watch(self, executor):
+        """ Register stdout and stderr of the started Executor process """
+        with self.lock:
+            if self.thread is None:
+                self.epoll = select.epoll()
+                self.thread = threading.Thread(target=self._run,
+                                               name="OutputSupervisor")
+                self.thread.setDaemon(True)
+                self.thread.start()
+            for name, stream in (("STDOUT", executor.proc.stdout),
+                                 ("STDERR", executor.proc.stderr)):
+                if executor.partialLines[name] is None:
+                    # already at EOF (handed over by backend 'select')
+                    continue
+                self.streams[stream.fileno()] = (executor, name)
+                # epoll set can be modified while the loop waits in it
+                self.epoll.register(stream.fileno(),
+                                    select.EPOLLIN | select.EPOLLHUP)
+
+    def _read(self, fd):
+        """ Read available output of the stream, pass it to its Executor """
+        with self.lock:
+            if fd not in self.streams:
+                return
+            executor, name = self.streams[fd]
+        try:
+            data = os.read(fd, 65536)
+        except OSError as ex:
+            if ex.errno in (errno.EAGAIN, errno.EINTR):
+                return
+            data = ""
+        if not data:
+            # EOF
+            with self.lock:
+                del self.streams[fd]
+                self.epoll.unregister(fd)
+        executor._received(name, data)
+
+    def _readNext(self):
+        """ Wait for output of any stream, read it """
+        try:
+            events = self.epoll.poll()
+        except IOError as ex:
+            if ex.errno == errno.EINTR:
+                return
+            raise
+        for fd, dummyEvent in events:
+            self._read(fd)
+
+    def _run(self):
+        backoff = MIN_ERROR_BACKOFF
+        while True:
+            try:
+                self._readNext()
+                backoff = MIN_ERROR_BACKOFF
+            except Exception as ex:
+                # consumers waiting for output would block forever if this
+                # thread ended
+                self.logger.error("Reading output of child processes failed, "
+                                  "reason: %s, retrying in %s [s]." % (ex, backoff))
+                time.sleep(backoff)
+                backoff = min(2 * backoff, MAX_ERROR_BACKOFF)
+
+
+_supervisor = OutputSupervisor()
+
+
+def getSupervisor():
+    """ Returns the process-wide OutputSupervisor instance """
+    return _supervisor
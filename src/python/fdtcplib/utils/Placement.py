@@ -0,0 +1,149 @@
+"""
+CPU, NUMA and I/O priority placement of processes (FDT Java).
+
+A PlacementPolicy is defined per action type (sender, receiver) in the
+fdtd configuration: CPU sets and / or NUMA nodes the processes may run
+on, ionice class and level, nice level. Concurrent processes are spread
+over the CPU sets (NUMA nodes) round-robin, each gets a Placement which
+Executor applies by running the command via:
+    - numactl binding its CPUs and memory to the NUMA node (and to the
+      CPU set, if also given),
+    - taskset for a CPU set without NUMA node,
+    - ionice for the ionice class and level, nice for the nice level.
+Nothing is done in the forked child of fdtd (multithreaded) before the
+command is executed. Affinity, priorities and memory policy are
+inherited by the children (sudo, FDT Java).
+"""
+import itertools
+import threading
+
+
+# ionice class names -> class numbers of ionice(1)
+IONICE_CLASSES = {"realtime": 1,
+                  "best-effort": 2,
+                  "idle": 3}
+NUMACTL = "numactl"
+TASKSET = "taskset"
+IONICE = "ionice"
+NICE = "nice"
+
+
+def parseCpuList(value):
+    """ CPU list as in cpuset(7) '0-3,8,10-11' -> list of CPU numbers """
+    cpus = []
+    for item in value.split(","):
+        item = item.strip()
+        if "-" in item:
+            first, last = item.split("-")
+            cpus.extend(range(int(first), int(last) + 1))
+        elif item:
+            cpus.append(int(item))
+    if not cpus:
+        raise ValueError("empty CPU list '%s'" % value)
+    return cpus
+
+
+class Placement(object):
+    """ Placement of a single process """
+
+    def __init__(self, cpus=None, numaNode=None, ioniceClass=None,
+                 ioniceLevel=None, nice=None):
+        self.cpus = cpus
+        self.numaNode = numaNode
+        self.ioniceClass = ioniceClass
+        self.ioniceLevel = ioniceLevel
+        self.nice = nice
+
+    def __str__(self):
+        return ("cpus: %s NUMA node: %s ionice: %s/%s nice: %s" %
+                (self.cpus, self.numaNode, self.ioniceClass, self.ioniceLevel,
+                 self.nice))
+
+    def wrapCommand(self, command):
+        """ Returns the command run via nice, ionice, numactl or taskset """
+        cpus = ",".join([str(cpu) for cpu in self.cpus or []])
+        wrapper = []
+        if self.nice is not None:
+            wrapper.extend([NICE, "-n", str(self.nice)])
+        if self.ioniceClass is not None:
+            ioclass = IONICE_CLASSES[self.ioniceClass]
+            wrapper.extend([IONICE, "-c", str(ioclass)])
+            # the idle class has no levels
+            if ioclass != IONICE_CLASSES["idle"]:
+                wrapper.extend(["-n", str(self.ioniceLevel or 0)])
+        if self.numaNode is not None:
+            wrapper.extend([NUMACTL, "--membind=%s" % self.numaNode])
+            if cpus:
+                wrapper.append("--physcpubind=%s" % cpus)
+            else:
+                wrapper.append("--cpunodebind=%s" % self.numaNode)
+        elif cpus:
+            wrapper.extend([TASKSET, "-c", cpus])
+        if not wrapper:
+            return command
+        return "%s %s" % (" ".join(wrapper), command)
+
+
+class PlacementPolicy(object):
+    """
+    Placement of processes of an action type, CPU sets and NUMA nodes are
+    handed out round-robin. If both are given, they pair up by position.
+    """
+
+    def __init__(self, cpuSets=None, numaNodes=None, ioniceClass=None,
+                 ioniceLevel=None, nice=None):
+        self.cpuSets = cpuSets or []
+        self.numaNodes = numaNodes or []
+        if self.cpuSets and self.numaNodes and len(self.cpuSets) != len(self.numaNodes):
+            raise ValueError("%s CPU sets don't pair up with %s NUMA nodes" %
+                             (len(self.cpuSets), len(self.numaNodes)))
+        if ioniceClass is not None and ioniceClass not in IONICE_CLASSES:
+            raise ValueError("unknown ionice class '%s', expecting one of %s" %
+                             (ioniceClass, ", ".join(sorted(IONICE_CLASSES))))
+        if ioniceLevel is not None and not 0 <= ioniceLevel <= 7:
+            raise ValueError("ionice level %s out of range 0 - 7" % ioniceLevel)
+        if nice is not None and not -20 <= nice <= 19:
+            raise ValueError("nice level %s out of range -20 - 19" % nice)
+        self.ioniceClass = ioniceClass
+        self.ioniceLevel = ioniceLevel
+        self.nice = nice
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def fromConf(cls, conf, kind):
+        """
+        Policy from <kind>CpuSets ('0-15;16-31'), <kind>NumaNodes ('0;1'),
+        <kind>IoniceClass, <kind>IoniceLevel and <kind>Nice options,
+        None if none of them is set. Raises ValueError on illegal values.
+        """
+        def get(name):
+            value = conf.get(kind + name)
+            return None if value is None or value == "" else str(value)
+
+        cpuSets = get("CpuSets")
+        numaNodes = get("NumaNodes")
+        ioniceClass = get("IoniceClass")
+        ioniceLevel = get("IoniceLevel")
+        nice = get("Nice")
+        if all(value is None for value in (cpuSets, numaNodes, ioniceClass,
+                                           ioniceLevel, nice)):
+            return None
+        return cls(cpuSets=[parseCpuList(cpuSet) for cpuSet in (cpuSets or "").split(";")
+                            if cpuSet.strip()],
+                   numaNodes=[int(node) for node in (numaNodes or "").split(";")
+                              if node.strip()],
+                   ioniceClass=ioniceClass,
+                   ioniceLevel=None if ioniceLevel is None else int(ioniceLevel),
+                   nice=None if nice is None else int(nice))
+
+    def next(self):
+        """ Placement of the next process """
+        slots = max(len(self.cpuSets), len(self.numaNodes))
+        with self.lock:
+            slot = next(self.counter) % slots if slots else None
+        return Placement(cpus=self.cpuSets[slot] if self.cpuSets else None,
+                         numaNode=self.numaNodes[slot] if self.numaNodes else None,
+                         ioniceClass=self.ioniceClass,
+                         ioniceLevel=self.ioniceLevel,
+                         nice=self.nice)
@@ -0,0 +1,99 @@
+"""
+Finding processes which own local TCP ports.
+
+Rather than asking every process for its connections (psutil), the
+kernel tables are read once: /proc/net/tcp{,6} map ports to socket
+inodes, /proc/<pid>/fd links map socket inodes to processes. The maps
+are cached for a short period, a burst of lookups (e.g. several
+"Address already in use" failures at once) reads /proc only once.
+"""
+import os
+import time
+import threading
+
+
+# TCP states as in /proc/net/tcp (include/net/tcp_states.h)
+TCP_STATES = {"01": "ESTABLISHED", "02": "SYN_SENT", "03": "SYN_RECV",
+              "04": "FIN_WAIT1", "05": "FIN_WAIT2", "06": "TIME_WAIT",
+              "07": "CLOSE", "08": "CLOSE_WAIT", "09": "LAST_ACK",
+              "0A": "LISTEN", "0B": "CLOSING"}
+
+
+class PortOwnerLookup(object):
+    """ Local TCP port -> owning processes, cached for ttl seconds """
+
+    def __init__(self, ttl=2, procDir="/proc"):
+        self.ttl = ttl
+        self.procDir = procDir
+        # local port -> list of (socket inode, TCP state)
+        self.sockets = {}
+        # socket inode -> set of PIDs which have it open
+        self.inodeOwners = {}
+        self.updated = None
+        self.lock = threading.Lock()
+
+    def _readSockets(self):
+        """ One pass over /proc/net/tcp and /proc/net/tcp6 """
+        sockets = {}
+        for table in ("tcp", "tcp6"):
+            try:
+                lines = open(os.path.join(self.procDir, "net", table)).readlines()
+            except IOError:
+                # e.g. IPv6 disabled
+                continue
+            # sl local_address rem_address st tx_queue:rx_queue tr:tm->when
+            #   retrnsmt uid timeout inode ...
+            for line in lines[1:]:
+                fields = line.split()
+                if len(fields) < 10:
+                    continue
+                port = int(fields[1].rsplit(":", 1)[1], 16)
+                state = TCP_STATES.get(fields[3], fields[3])
+                sockets.setdefault(port, []).append((int(fields[9]), state))
+        return sockets
+
+    def _readInodeOwners(self):
+        """ One pass over /proc/<pid>/fd links of all (accessible) processes """
+        inodeOwners = {}
+        for pid in os.listdir(self.procDir):
+            if not pid.isdigit():
+                continue
+            fdDir = os.path.join(self.procDir, pid, "fd")
+            try:
+                fds = os.listdir(fdDir)
+            except OSError:
+                # process gone or not permitted
+                continue
+            for fd in fds:
+                try:
+                    link = os.readlink(os.path.join(fdDir, fd))
+                except OSError:
+                    continue
+                # socket:[12345]
+                if link.startswith("socket:["):
+                    inodeOwners.setdefault(int(link[8:-1]), set()).add(int(pid))
+        return inodeOwners
+
+    def _refresh(self):
+        """ Re-read the tables if the cached ones are older than ttl """
+        now = time.time()
+        if self.updated is None or now - self.updated > self.ttl:
+            self.sockets = self._readSockets()
+            self.inodeOwners = self._readInodeOwners()
+            self.updated = now
+
+    def getOwners(self, port, refresh=False):
+        """
+        Returns list of (PID, TCP state) of sockets bound to the local
+        port. Sockets without owner (TIME_WAIT) have PID None. With
+        refresh, the cache is not used.
+        """
+        with self.lock:
+            if refresh:
+                self.updated = None
+            self._refresh()
+            owners = []
+            for inode, state in self.sockets.get(port, []):
+                pids = self.inodeOwners.get(inode) or [None]
+                owners.extend([(pid, state) for pid in sorted(pids)])
+            return owners
@@ -0,0 +1,155 @@
+"""
+Waiting for child processes without sleep-polling.
+
+A single thread blocks in wait4() for any child of this process and
+wakes up the threads waiting for a particular process (via a condition
+variable) as soon as the kernel reports its exit. Waiting with a timeout
+(e.g. killTimeout of FDT Java processes) returns within milliseconds
+of the process exit rather than on the next poll.
+
+The reaper collects all children of the process, hence all processes
+shall be started by Executor which registers them here; the exit status
+of a child which is not registered (yet) is kept until it is.
+Resource usage of the reaped process (including its descendants it
+waited for, e.g. sudo for FDT Java) is stored as proc.rusage.
+Signals (SIGCHLD) are not used on purpose: with Python 2 a signal handler
+makes blocking calls in other threads fail with EINTR.
+Unexpected wait4() errors are logged and retried with a backoff, the
+thread never ends. The exit status of a registered process reaped
+elsewhere is lost, the process is reported failed (LOST_RETURNCODE).
+"""
+import os
+import time
+import errno
+import logging
+import threading
+
+from fdtcplib.utils.Logger import Logger
+
+
+# return code of registered processes whose exit status was lost (reaped
+# elsewhere), they must not look successful
+LOST_RETURNCODE = 255
+# wait [s] before retrying after an unexpected wait4() error, doubled on
+# each further error up to MAX_ERROR_BACKOFF
+MIN_ERROR_BACKOFF = 0.1
+MAX_ERROR_BACKOFF = 10
+
+
+def returnCodeFromStatus(status):
+    """ wait4() status -> return code as in subprocess.Popen.returncode """
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+class ProcessReaper(object):
+    """ Reaps child processes, wakes up threads waiting for them """
+
+    def __init__(self, logger=None):
+        # errors only, fdtd sets its own logger (see FDTD)
+        self.logger = logger or Logger(name="ProcessReaper", level=logging.ERROR)
+        # PID -> subprocess.Popen instance of running registered processes
+        self.procs = {}
+        # PID -> (wait4() status, rusage) of reaped processes not
+        # registered (yet)
+        self.unclaimed = {}
+        self.cond = threading.Condition()
+        self.thread = None
+
+    def watch(self, proc):
+        """ Register a process (subprocess.Popen instance) for reaping """
+        with self.cond:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run,
+                                               name="ProcessReaper")
+                self.thread.setDaemon(True)
+                self.thread.start()
+            reaped = self.unclaimed.pop(proc.pid, None)
+            if reaped is not None:
+                proc.returncode = returnCodeFromStatus(reaped[0])
+                proc.rusage = reaped[1]
+            elif proc.returncode is None:
+                self.procs[proc.pid] = proc
+            self.cond.notify_all()
+
+    def wait(self, proc, timeout=None):
+        """
+        Wait for the process to finish, at most timeout seconds (None
+        means no limit). Returns the return code, None if the process
+        still runs.
+        """
+        with self.cond:
+            if proc.returncode is None and proc.pid not in self.procs:
+                self.watch(proc)
+            deadline = None if timeout is None else time.time() + timeout
+            while proc.returncode is None:
+                # in periods, Condition.wait() without timeout can't be interrupted
+                remaining = 60 if deadline is None else deadline - time.time()
+                if remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+            return proc.returncode
+
+    def _reaped(self, pid, status, rusage):
+        """ Record exit status of the process and wake up the waiters """
+        with self.cond:
+            proc = self.procs.pop(pid, None)
+            if proc is None:
+                self.unclaimed[pid] = (status, rusage)
+            elif proc.returncode is None:
+                proc.returncode = returnCodeFromStatus(status)
+                proc.rusage = rusage
+            self.cond.notify_all()
+
+    def _lost(self):
+        """
+        There is no child to wait for (ECHILD), registered processes were
+        reaped elsewhere (not by wait4() here), their exit status is lost.
+        """
+        with self.cond:
+            for proc in self.procs.values():
+                if proc.returncode is None:
+                    self.logger.error("Exit status of process PID: %s was lost, "
+                                      "return code %s is reported." %
+                                      (proc.pid, LOST_RETURNCODE))
+                    proc.returncode = LOST_RETURNCODE
+            self.procs.clear()
+            self.cond.notify_all()
+
+    def _reapNext(self):
+        """ Waits for a child to exit and records it """
+        with self.cond:
+            while not self.procs:
+                self.cond.wait()
+        try:
+            pid, status, rusage = os.wait4(-1, 0)
+        except OSError as ex:
+            if ex.errno == errno.EINTR:
+                return
+            if ex.errno != errno.ECHILD:
+                raise
+            self._lost()
+            return
+        self._reaped(pid, status, rusage)
+
+    def _run(self):
+        backoff = MIN_ERROR_BACKOFF
+        while True:
+            try:
+                self._reapNext()
+                backoff = MIN_ERROR_BACKOFF
+            except Exception as ex:
+                # waiters would block forever if this thread ended
+                self.logger.error("Reaping child processes failed, reason: %s, "
+                                  "retrying in %s [s]." % (ex, backoff))
+                time.sleep(backoff)
+                backoff = min(2 * backoff, MAX_ERROR_BACKOFF)
+
+
+_reaper = ProcessReaper()
+
+
+def getReaper():
+    """ Returns the process-wide ProcessReaper instance """
+    return _reaper
@@ -0,0 +1,205 @@
+"""
+Accounting of resources used by processes run by Executor (FDT Java).
+
+The process started by Executor leads its own process group (sudo,
+wrapper script, JVM). ResourceMonitor (a single thread for all
+processes) reads /proc/<pid>/stat, status and io of the group members
+every sampling interval, the last values of each member are summed up:
+CPU time, context switches, storage read / write bytes; peak RSS is the
+maximum of the group RSS sums. Once the process exits, its rusage (as
+collected by the process reaper, includes the descendants it waited
+for) completes the numbers, the values are never below the sampled ones.
+/proc/<pid>/io of processes of other users (sudo) is readable only for
+root, storage bytes then come from rusage block counts.
+"""
+import os
+import time
+import threading
+
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+# values of /proc/<pid>/status and io which are accounted
+STATUS_FIELDS = {"VmRSS": "rss", "VmHWM": "peakRss",
+                 "voluntary_ctxt_switches": "voluntaryCtxSwitches",
+                 "nonvoluntary_ctxt_switches": "involuntaryCtxSwitches"}
+IO_FIELDS = {"read_bytes": "readBytes", "write_bytes": "writeBytes"}
+# cumulative counters, summed over processes of the group
+COUNTERS = ("cpuUser", "cpuSystem", "voluntaryCtxSwitches",
+            "involuntaryCtxSwitches", "readBytes", "writeBytes")
+
+
+def readProcessGroups(procDir="/proc"):
+    """ One pass over /proc/<pid>/stat, returns process group -> PIDs """
+    groups = {}
+    for pid in os.listdir(procDir):
+        if not pid.isdigit():
+            continue
+        try:
+            stat = open(os.path.join(procDir, pid, "stat")).read()
+        except IOError:
+            # process gone
+            continue
+        # pid (comm) state ppid pgrp ..., comm may contain spaces
+        fields = stat[stat.rfind(")") + 2:].split()
+        groups.setdefault(int(fields[2]), []).append(int(pid))
+    return groups
+
+
+def readProcessUsage(pid, procDir="/proc"):
+    """
+    Returns resources used by the process so far (CPU [s], memory
+    [bytes], context switches, storage bytes), None if it's gone.
+    """
+    pidDir = os.path.join(procDir, str(pid))
+    try:
+        stat = open(os.path.join(pidDir, "stat")).read()
+        status = open(os.path.join(pidDir, "status")).readlines()
+    except IOError:
+        return None
+    fields = stat[stat.rfind(")") + 2:].split()
+    usage = dict(cpuUser=float(fields[11]) / CLOCK_TICKS,
+                 cpuSystem=float(fields[12]) / CLOCK_TICKS)
+    for line in status:
+        name, dummy, value = line.partition(":")
+        if name in STATUS_FIELDS:
+            value = int(value.split()[0])
+            # memory in kB
+            usage[STATUS_FIELDS[name]] = value * 1024 if name.startswith("Vm") else value
+    try:
+        for line in open(os.path.join(pidDir, "io")).readlines():
+            name, dummy, value = line.partition(":")
+            if name in IO_FIELDS:
+                usage[IO_FIELDS[name]] = int(value)
+    except IOError:
+        # not permitted (process of another user)
+        pass
+    return usage
+
+
+class ResourceAccount(object):
+    """ Resources used by a process group, sampled and final numbers """
+
+    def __init__(self, pgid, interval=0):
+        self.pgid = pgid
+        # sampling interval [s], 0 - not sampled
+        self.interval = interval
+        self.startTime = time.time()
+        self.nextSample = self.startTime
+        self.endTime = None
+        # PID -> last usage sampled of processes of the group
+        self.processes = {}
+        self.peakRss = 0
+        self.numSamples = 0
+        self.rusage = None
+        self.lock = threading.Lock()
+
+    def sample(self, pids, procDir="/proc"):
+        """ Read usage of the group members (PIDs) """
+        rss = 0
+        for pid in pids:
+            usage = readProcessUsage(pid, procDir)
+            if usage is None:
+                continue
+            rss += usage.get("rss", 0)
+            with self.lock:
+                self.processes[pid] = usage
+        with self.lock:
+            self.peakRss = max(self.peakRss, rss)
+            self.numSamples += 1
+            self.nextSample = time.time() + self.interval
+
+    def finish(self, rusage):
+        """ The process exited, rusage as returned by wait4() (or None) """
+        with self.lock:
+            self.rusage = rusage
+            if self.endTime is None:
+                self.endTime = time.time()
+
+    def getUsage(self):
+        """ Returns dict of the resources used so far (final once finished) """
+        with self.lock:
+            usage = dict([(name, 0) for name in COUNTERS])
+            peakRss = self.peakRss
+            for processUsage in self.processes.values():
+                for name in COUNTERS:
+                    usage[name] += processUsage.get(name, 0)
+                peakRss = max(peakRss, processUsage.get("peakRss", 0))
+            if self.rusage is not None:
+                ru = self.rusage
+                fromRusage = dict(cpuUser=ru.ru_utime, cpuSystem=ru.ru_stime,
+                                  voluntaryCtxSwitches=ru.ru_nvcsw,
+                                  involuntaryCtxSwitches=ru.ru_nivcsw,
+                                  readBytes=ru.ru_inblock * 512,
+                                  writeBytes=ru.ru_oublock * 512)
+                for name in COUNTERS:
+                    usage[name] = max(usage[name], fromRusage[name])
+                # maximum resident set of a single process, kB
+                peakRss = max(peakRss, ru.ru_maxrss * 1024)
+            usage["peakRss"] = peakRss
+            usage["samples"] = self.numSamples
+            usage["wallTime"] = (self.endTime or time.time()) - self.startTime
+            usage["finished"] = self.endTime is not None
+            return usage
+
+
+class ResourceMonitor(object):
+    """ Samples registered ResourceAccounts in a single thread """
+
+    def __init__(self, tick=1, procDir="/proc"):
+        # how often [s] it's checked which accounts are due to be sampled
+        self.tick = tick
+        self.procDir = procDir
+        self.accounts = set()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def watch(self, account):
+        """ Sample the account every account.interval seconds until unwatched """
+        if not account.interval:
+            return
+        with self.lock:
+            self.accounts.add(account)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run,
+                                               name="ResourceMonitor")
+                self.thread.setDaemon(True)
+                self.thread.start()
+
+    def unwatch(self, account):
+        with self.lock:
+            self.accounts.discard(account)
+
+    def sampleDue(self):
+        """ Sample accounts due, /proc is scanned once for all of them """
+        now = time.time()
+        with self.lock:
+            due = [account for account in self.accounts if account.nextSample <= now]
+        if not due:
+            return
+        groups = readProcessGroups(self.procDir)
+        for account in due:
+            account.sample(groups.get(account.pgid, []), self.procDir)
+
+    def _run(self):
+        while True:
+            time.sleep(self.tick)
+            self.sampleDue()
+
+
+_monitor = ResourceMonitor()
+
+
+def getMonitor():
+    """ Returns the process-wide ResourceMonitor instance """
+    return _monitor
+
+
+def formatUsage(usage):
+    """ One line summary of a usage dict (as returned by getUsage()) """
+    return ("CPU user: %.2f [s] system: %.2f [s], peak RSS: %.1f [MB], "
+            "context switches voluntary: %s involuntary: %s, storage read: "
+            "%s [B] written: %s [B], wall time: %.1f [s], %s samples" %
+            (usage["cpuUser"], usage["cpuSystem"], usage["peakRss"] / 1048576.0,
+             usage["voluntaryCtxSwitches"], usage["involuntaryCtxSwitches"],
+             usage["readBytes"], usage["writeBytes"], usage["wallTime"],
+             usage["samples"]))
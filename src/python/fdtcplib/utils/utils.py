@@ -3,6 +3,8 @@ Helper routines.
 """
 import os
 import sys
+import errno
+import socket
 import apmon
 import datetime
 import random
@@ -77,6 +79,36 @@ def getDateTime():
     return retVal
 
 
+def isPortBindable(port):
+    """
+    Returns True if a listening TCP socket may be bound to port on all
+    interfaces. SO_REUSEADDR is not set, so a port still held by
+    any socket (including TIME_WAIT connections) is not bindable.
+    Address families the host has no address of are skipped, any other
+    bind failure means the port is not bindable, nothing is raised.
+    """
+    families = [socket.AF_INET]
+    if socket.has_ipv6:
+        families.append(socket.AF_INET6)
+    for family in families:
+        try:
+            sock = socket.socket(family, socket.SOCK_STREAM)
+        except socket.error:
+            # address family not supported by the host
+            continue
+        try:
+            sock.bind(("", port))
+        except socket.error as ex:
+            if ex.errno in (errno.EADDRNOTAVAIL, errno.EAFNOSUPPORT):
+                # e.g. IPv6 compiled in, but the host has no IPv6 address
+                continue
+            # in use (EADDRINUSE), not permitted (EACCES), ...
+            return False
+        finally:
+            sock.close()
+    return True
+
+
 def getOpenFilesList(offset=4):
     """
     Returns all currently open files.
@@ -0,0 +1,100 @@
+"""
+Microbenchmark of fdtd PortReservation (port allocator for FDT Java
+servers) under concurrent reserve / release traffic.
+
+Compares the current allocator with the former linear scan one, run
+from the projects root directory:
+    python tests/loadtest/port_reservation_benchmark.py [numPorts] [numThreads] [numOps]
+
+"""
+from __future__ import print_function
+
+import imp
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+sys.path.insert(0, os.path.join(ROOT, "src", "python"))
+fdtd = imp.load_source("fdtd", os.path.join(ROOT, "src", "python", "fdtd"))
+from fdtcplib.common.errors import PortReservationException
+
+
+class LinearPortReservation(object):
+    """ The former allocator - linear scan of all ports on reserve and release """
+    def __init__(self, portMin, portMax):
+        self.ports = [[port, 0, False] for port in range(portMin, portMax + 1)]
+        self.numTakenPorts = 0
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        with self.lock:
+            if len(self.ports) == self.numTakenPorts:
+                raise PortReservationException("No free port to reserve.")
+            candid = None
+            for port in self.ports:
+                if not port[2] and (candid is None or port[1] < candid[1]):
+                    candid = port
+            self.numTakenPorts += 1
+            candid[1] += 1
+            candid[2] = True
+            return candid[0]
+
+    def release(self, portToRel):
+        with self.lock:
+            for port in self.ports:
+                if port[0] == portToRel and port[2]:
+                    port[2] = False
+                    self.numTakenPorts -= 1
+                    return
+            raise PortReservationException("Port not reserved %s" % portToRel)
+
+
+def worker(portMgmt, numOps, errors):
+    """ Keeps a few ports reserved, releases the oldest one after each reserve """
+    held = []
+    for dummy in range(numOps):
+        try:
+            held.append(portMgmt.reserve())
+        except PortReservationException:
+            errors.append(1)
+        if len(held) > 4 or (held and len(errors) > 0):
+            portMgmt.release(held.pop(0))
+    for port in held:
+        portMgmt.release(port)
+
+
+def run(portMgmtClass, numPorts, numThreads, numOps):
+    """ Returns reserve / release operations per second """
+    portMgmt = portMgmtClass(54321, 54321 + numPorts - 1)
+    # most of the range is taken, as on a busy fdtd
+    taken = [portMgmt.reserve() for dummy in range(numPorts - 5 * numThreads - 10)]
+    errors = []
+    threads = [threading.Thread(target=worker, args=(portMgmt, numOps, errors))
+               for dummy in range(numThreads)]
+    startTime = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.time() - startTime
+    for port in taken:
+        portMgmt.release(port)
+    assert portMgmt.numTakenPorts == 0
+    return 2 * numThreads * numOps / duration, len(errors)
+
+
+def main():
+    numPorts = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    numThreads = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    numOps = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+    print("%s ports, %s threads, %s reserve + release each" % (numPorts, numThreads, numOps))
+    for name, portMgmtClass in (("linear scan", LinearPortReservation),
+                                ("PortReservation", fdtd.PortReservation)):
+        opsPerSec, errors = run(portMgmtClass, numPorts, numThreads, numOps)
+        print("%-16s %12.0f ops/s  (%s failed reservations)" % (name, opsPerSec, errors))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Benchmark of fdtd PYRO server models, thread pool sizes and serializers
+(pyroServerType, pyroThreadPoolMin, pyroThreadPoolMax, pyroSerializers
+fdtd options) - request latency and throughput at increasing number of
+concurrent clients.
+
+fdtd (FDTD object, without AuthService) is started in a separate process
+for each server configuration, each client keeps its own connection and
+repeats TestAction requests (the first request of each fdtcp transfer).
+Further connected but idle clients (--held) stand for running transfers
+whose log streams keep a connection (and a server thread) each.
+Run from the projects root directory:
+    python tests/loadtest/pyro_server_benchmark.py [options]
+e.g.
+    python tests/loadtest/pyro_server_benchmark.py --clients 10,100,500 \
+        --configs thread:4:40,thread:16:600,multiplex --held 20
+
+"""
+from __future__ import print_function
+
+import imp
+import os
+import sys
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from optparse import OptionParser
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+sys.path.insert(0, os.path.join(ROOT, "src", "python"))
+import Pyro4
+from Pyro4.errors import PyroError
+from fdtcplib.utils.Logger import Logger
+
+CONFIG = """[general]
+port = %(port)s
+portAuthService = %(portAuth)s
+fdtSendingClientKillTimeout = 1
+fdtServerLogOutputTimeout = 1
+fdtReceivingServerKillTimeout = 1
+fdtSendingClientCommand = /bin/true
+fdtReceivingServerCommand = /bin/true
+fdtServerLogOutputToWaitFor = "started"
+killCommandSudo = kill -%%(signal)s -- %%(pid)s
+portRangeFDTServer = 54321,54330
+transferSeparateLogFile = False
+daemonize = False
+debug = CRITICAL
+pyroServerType = %(serverType)s
+pyroThreadPoolMin = %(poolMin)s
+pyroThreadPoolMax = %(poolMax)s
+pyroSerializers = %(serializer)s
+"""
+
+
+def serve(confFile):
+    """ Run fdtd PYRO service in this process (until killed) """
+    fdtd = imp.load_source("fdtd", os.path.join(ROOT, "src", "python", "fdtd"))
+    conf = fdtd.ConfigFDTD(["-c", confFile])
+    conf.sanitize()
+    logger = Logger(name="fdtd", level=conf.get("debug"))
+    daemon = fdtd.FDTD(conf, None, logger)
+    daemon.start()
+
+
+def getFreePort():
+    sock = socket.socket()
+    sock.bind(("localhost", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def startServer(serverType, poolMin, poolMax, serializer):
+    """ Returns fdtd process and its service URI once it accepts connections """
+    port = getFreePort()
+    confFile = tempfile.NamedTemporaryFile(suffix=".conf", delete=False)
+    confFile.write(CONFIG % dict(port=port, portAuth=getFreePort(), serverType=serverType,
+                                 poolMin=poolMin, poolMax=poolMax, serializer=serializer))
+    confFile.close()
+    proc = subprocess.Popen([sys.executable, os.path.abspath(__file__),
+                             "--serve", confFile.name])
+    deadline = time.time() + 30
+    while time.time() < deadline and proc.poll() is None:
+        try:
+            socket.create_connection(("localhost", port), 1).close()
+            break
+        except socket.error:
+            time.sleep(0.1)
+    os.unlink(confFile.name)
+    if proc.poll() is not None:
+        raise RuntimeError("fdtd failed to start, return code %s" % proc.returncode)
+    return proc, "PYRO:FDTDService@localhost:%s" % port
+
+
+def client(uri, stopTime, latencies, errors):
+    """ Repeats TestAction requests on its own connection """
+    proxy = Pyro4.Proxy(uri)
+    proxy._pyroTimeout = 30
+    action = dict(action="TestAction", hostSrc="src", hostDest="dest", timeout=60)
+    while time.time() < stopTime:
+        action["id"] = "bench-%s" % threading.current_thread().name
+        startTime = time.time()
+        try:
+            proxy.service(action)
+            latencies.append(time.time() - startTime)
+        except PyroError:
+            errors.append(1)
+            # the connection is refused while there is no free server thread
+            proxy._pyroRelease()
+            time.sleep(0.1)
+    proxy._pyroRelease()
+
+
+def run(uri, numClients, numHeld, duration):
+    """ Returns latencies of successful requests and number of failed ones """
+    held = []
+    for dummy in range(numHeld):
+        proxy = Pyro4.Proxy(uri)
+        try:
+            proxy._pyroBind()
+            held.append(proxy)
+        except PyroError:
+            pass
+    latencies = []
+    errors = []
+    stopTime = time.time() + duration
+    threads = [threading.Thread(target=client, args=(uri, stopTime, latencies, errors),
+                                name="client-%s" % i) for i in range(numClients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for proxy in held:
+        proxy._pyroRelease()
+    return sorted(latencies), len(errors)
+
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("--serve", help="internal - run fdtd with the config file")
+    parser.add_option("--clients", default="10,100,500",
+                      help="numbers of concurrent clients, default 10,100,500")
+    parser.add_option("--configs", default="thread:4:40,thread:16:600,multiplex",
+                      help="server configurations serverType[:poolMin:poolMax], "
+                           "default thread:4:40,thread:16:600,multiplex")
+    parser.add_option("--serializer", default="serpent",
+                      help="serializer (serpent, json, marshal), default serpent")
+    parser.add_option("--held", default=0, type="int",
+                      help="further connected idle clients, default 0")
+    parser.add_option("--duration", default=5, type="int",
+                      help="seconds per measurement, default 5")
+    opts, dummyArgs = parser.parse_args()
+    if opts.serve:
+        serve(opts.serve)
+        return
+
+    Pyro4.config.SERIALIZER = opts.serializer
+    print("serializer %s, %s s per measurement, %s held connections" %
+          (opts.serializer, opts.duration, opts.held))
+    print("%-18s %8s %10s %10s %10s %10s" % ("server", "clients", "req/s",
+                                            "p50 [ms]", "p95 [ms]", "failed"))
+    for config in opts.configs.split(","):
+        serverType, poolMin, poolMax = (config.split(":") + [4, 40])[:3]
+        proc, uri = startServer(serverType, poolMin, poolMax, opts.serializer)
+        try:
+            for numClients in [int(num) for num in opts.clients.split(",")]:
+                latencies, errors = run(uri, numClients, opts.held, opts.duration)
+                print("%-18s %8s %10.0f %10.1f %10.1f %10s" %
+                      (config, numClients, len(latencies) / float(opts.duration),
+                       1000 * percentile(latencies, 0.5),
+                       1000 * percentile(latencies, 0.95), errors))
+        finally:
+            proc.kill()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+py.test unittest testsuite for common.StatFilesAction
+
+"""
+import os
+import logging
+import shutil
+import tempfile
+
+from fdtcplib.utils.Logger import Logger
+from fdtcplib.common.StatFilesAction import StatFilesAction
+
+
+def testStatFilesAction():
+    dataDir = tempfile.mkdtemp()
+    try:
+        fileName = os.path.join(dataDir, "file")
+        open(fileName, "w").write(1000 * "a")
+        outside = tempfile.NamedTemporaryFile("w+")
+        conf = dict(statFilesPrefixes="/nonexisting, %s/" % dataDir, statFilesMaxFiles=10)
+        files = [fileName, os.path.join(dataDir, "nonexisting"), outside.name,
+                 os.path.join(dataDir, "..", os.path.basename(outside.name))]
+        options = dict(id="some_id", files=files, conf=conf,
+                       logger=Logger(level=logging.DEBUG))
+        a = StatFilesAction(options)
+        a.execute()
+        assert a.getStatus() == 0
+        # files outside the allowed prefixes are not stat'ed
+        assert a.getSizes() == dict([(fileName, 1000)] + [(f, None) for f in files[1:]])
+        # at most statFilesMaxFiles files
+        conf["statFilesMaxFiles"] = 1
+        options["files"] = [os.path.join(dataDir, "nonexisting"), fileName]
+        a = StatFilesAction(options)
+        a.execute()
+        assert a.getSizes()[fileName] is None
+        # no prefixes configured, nothing is stat'ed
+        options["conf"] = dict(statFilesMaxFiles=10)
+        a = StatFilesAction(options)
+        a.execute()
+        assert a.getSizes()[fileName] is None
+    finally:
+        shutil.rmtree(dataDir)
@@ -0,0 +1,45 @@
+"""
+py.test unittest testsuite for common.TransferSessionAction
+
+"""
+import logging
+
+import py.test
+from mock import Mock
+
+from fdtcplib.utils.Logger import Logger
+from fdtcplib.common.errors import FDTDException
+from fdtcplib.common.TransferSessionAction import TransferSessionAction
+
+
+def getOptions(role):
+    options = dict(transferId="some_id", role=role, logger=Logger(level=logging.DEBUG),
+                   caller=Mock(), conf=Mock(), apmonObj=Mock())
+    options['conf'].get.return_value = None
+    return options
+
+
+def testTransferSessionActionUnknownRole():
+    py.test.raises(FDTDException, TransferSessionAction, getOptions("nonsense"))
+
+
+def testTransferSessionActionReceiverSession():
+    a = TransferSessionAction(getOptions("receiver"))
+    # simulate started FDT Java server
+    a.action.status = 0
+    a.action.port = 54321
+    session = a.getSession("PYRO:obj_123@localhost:8444")
+    assert session["id"] == "some_id"
+    assert session["status"] == 0
+    assert session["serverPort"] == 54321
+    assert session["uri"] == "PYRO:obj_123@localhost:8444"
+    assert a.getServerPort() == 54321
+
+
+def testTransferSessionActionSenderSession():
+    a = TransferSessionAction(getOptions("sender"))
+    a.action.status = 0
+    session = a.getSession("PYRO:obj_456@localhost:8444")
+    assert session["role"] == "sender"
+    assert session["serverPort"] is None
+    py.test.raises(NotImplementedError, a.getServerPort)
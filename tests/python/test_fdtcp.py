@@ -8,25 +8,41 @@ from __future__ import print_function
 from builtins import zip
 
 
+import imp
 import os
 import sys
 import tempfile
 import logging
 import threading
+import time
 
 import py.test
-from mock import Mock
+import Pyro4
+from mock import Mock, patch
 
-from fdtcplib.fdtcp import Transfer
-from fdtcplib.fdtcp import Transfers
-from fdtcplib.fdtcp import FDTCopy
-from fdtcplib.fdtcp import ConfigFDTCopy
-from fdtcplib.common.TransferFile import TransferFile
+from fdtcplib.utils.FDTOutputParser import FDTOutputParser
 from fdtcplib.common.errors import FDTCopyException
+from fdtcplib.common.errors import FDTCopyShutdownBySignal
+from fdtcplib.common.errors import ServiceBusyException
 from fdtcplib.utils.Logger import Logger
-from fdtcplib.common.actions import TestAction, SendingClientAction
+from fdtcplib.common.TestAction import TestAction
+from fdtcplib.common.SendingClientAction import SendingClientAction
 from fdtcplib.utils.Config import ConfigurationException
 
+# fdtcp is a script (no .py suffix), load it as a module
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "src", "python")
+fdtcpModule = imp.load_source("fdtcp", os.path.join(SRC_DIR, "fdtcp"))
+Transfer = fdtcpModule.Transfer
+Transfers = fdtcpModule.Transfers
+FDTCopy = fdtcpModule.FDTCopy
+ConfigFDTCopy = fdtcpModule.ConfigFDTCopy
+TransferScheduler = fdtcpModule.TransferScheduler
+FDTCopyPool = fdtcpModule.FDTCopyPool
+TransferEngine = fdtcpModule.TransferEngine
+splitBySize = fdtcpModule.splitBySize
+ReportWriter = fdtcpModule.ReportWriter
+runTransfer = fdtcpModule.runTransfer
+
 
 def testTransferInstanceAttributesAccess():
     """
@@ -311,3 +327,328 @@ fdt://localhost:111/tmp/file9Y   fdt://localhost:222/tmp/fileIO"""
 
     # clean up after test, only if succeeded
     os.unlink(sndClientAction.options["fileList"])
+
+
+def testTransferSchedulerLimits():
+    """
+    Concurrent transfers must respect both global and per host pair limits,
+    failed transfers must be reflected in the exit status.
+    """
+    lock = threading.Lock()
+    running = {}
+    peak = {}
+
+    class MockTransfer(object):
+        def __init__(self, hostPair, fail=False):
+            self.hostPair = hostPair
+            self.fail = fail
+            self.result = None
+            self.log = None
+
+        def getHostPair(self):
+            return self.hostPair
+
+        def performTransfer(self):
+            with lock:
+                running[self.hostPair] = running.get(self.hostPair, 0) + 1
+                running["total"] = running.get("total", 0) + 1
+                for key in (self.hostPair, "total"):
+                    peak[key] = max(peak.get(key, 0), running[key])
+            time.sleep(0.1)
+            with lock:
+                running[self.hostPair] -= 1
+                running["total"] -= 1
+            if self.fail:
+                raise FDTCopyException("transfer failed")
+
+        def prepareRetry(self):
+            return False
+
+    logger = Logger("test logger", level=logging.DEBUG)
+    transfers = [MockTransfer("a"), MockTransfer("a"), MockTransfer("a", fail=True),
+                 MockTransfer("b"), MockTransfer("b", fail=True), MockTransfer("c")]
+    scheduler = TransferScheduler(transfers, 4, 2, logger)
+    assert scheduler.run() == 1
+    assert peak["total"] <= 4
+    assert peak["a"] <= 2
+    assert peak["b"] <= 2
+    assert [t.result for t in transfers] == [0, 0, 1, 0, 1, 0]
+
+
+def testFDTCopyPoolReusesHealthyProxies():
+    logger = Logger("test logger", level=logging.DEBUG)
+    conf = ConfigFDTCopy("fdt://host1:123/tmp/file fdt://host2:124/tmp/file1".split())
+    conf.sanitize()
+    pool = FDTCopyPool(conf, logger)
+    uri = "PYRO:FDTDService@localhost:1"
+    fdtCopy1 = pool.acquire(uri)
+    fdtCopy2 = pool.acquire(uri)
+    # proxy in use is never handed out twice
+    assert fdtCopy1 is not fdtCopy2
+    pool.release(fdtCopy1)
+    assert pool.acquire(uri) is fdtCopy1
+    # nothing listens on port 1, the call fails, the proxy is discarded
+    py.test.raises(FDTCopyException, fdtCopy1.call,
+                   dict(action="TestAction", timeout=2))
+    assert fdtCopy1.broken
+    pool.release(fdtCopy1)
+    assert pool.acquire(uri) is not fdtCopy1
+    assert pool.numCreated == 3
+    pool.close()
+
+
+def testFDTCopyRepeatsRequestsRefusedByBusyFdtd():
+    logger = Logger("test logger", level=logging.DEBUG)
+    fdtCopy = FDTCopy("PYRO:FDTDService@localhost:1", logger, busyWait=5)
+    fdtCopy._call = Mock(side_effect=[ServiceBusyException("busy", 0.1),
+                                      ServiceBusyException("busy", 0.1),
+                                      "result"])
+    assert fdtCopy.call(dict(action="ReceivingServerAction")) == "result"
+    assert fdtCopy._call.call_count == 3
+    # retry after hint beyond busyWait
+    fdtCopy = FDTCopy("PYRO:FDTDService@localhost:1", logger, busyWait=5)
+    fdtCopy._call = Mock(side_effect=ServiceBusyException("busy", 60))
+    py.test.raises(FDTCopyException, fdtCopy.call, dict(action="ReceivingServerAction"))
+    assert fdtCopy._call.call_count == 1
+
+
+def testFDTCopyStreamsBatchesOfOutput():
+    logger = Logger("test logger", level=logging.DEBUG)
+    fdtCopy = FDTCopy("PYRO:FDTDService@localhost:1", logger)
+    fdtCopy.setDeadlines = Mock()
+    result = Mock()
+    result.executeWithLogOut.return_value = iter([
+        [{"STDOUT": "line 1\n"}, {"STDERR": "line 2\n"}],
+        [{"ReturnCode": 0, "Status": "SUCCESS"}]])
+    assert list(fdtCopy.stream(result)) == [{"STDOUT": "line 1\n"},
+                                            {"STDERR": "line 2\n"},
+                                            {"ReturnCode": 0, "Status": "SUCCESS"}]
+    # single items of fdtd which doesn't batch
+    result.executeWithLogOut.return_value = iter([{"STDOUT": "line 1\n"}])
+    assert list(fdtCopy.stream(result)) == [{"STDOUT": "line 1\n"}]
+
+
+def testConfigRemoteCallDeadlines():
+    conf = ConfigFDTCopy("--timeout 5 --callTimeout 0 fdt://host1:123/tmp/file "
+                         "fdt://host2:124/tmp/file1".split())
+    conf.sanitize()
+    # connect deadline defaults to timeout, 0 means no deadline
+    assert conf.get("connectTimeout") == 5
+    assert conf.get("callTimeout") is None
+    conf = ConfigFDTCopy("--streamTimeout -1 fdt://host1:123/tmp/file "
+                         "fdt://host2:124/tmp/file1".split())
+    py.test.raises(ConfigurationException, conf.sanitize)
+
+
+def testTransferProbesRemotePartiesConcurrently():
+    logger = Logger("test logger", level=logging.DEBUG)
+    conf = ConfigFDTCopy("fdt://host1:123/tmp/file fdt://host2:124/tmp/file1".split())
+    conf.sanitize()
+    transfer = Transfer(conf, None, logger)
+
+    class MockFDTCopy(object):
+        def __init__(self, uri, fail):
+            self.uri = uri
+            self.fail = fail
+
+        def perform(self, action, allActions, performer):
+            time.sleep(0.5)
+            if self.fail:
+                raise FDTCopyException("%s is down" % self.uri)
+            allActions[performer][action["action"]] = True
+
+    transfer.receiver = MockFDTCopy("receiverURI", True)
+    transfer.sender = MockFDTCopy("senderURI", True)
+    startTime = time.time()
+    py.test.raises(FDTCopyException, transfer._performTestActions)
+    # both timeouts run at the same time
+    assert time.time() - startTime < 1
+    assert transfer.toCleanup == []
+
+    transfer.receiver = MockFDTCopy("receiverURI", False)
+    transfer.sender = MockFDTCopy("senderURI", False)
+    transfer._performTestActions()
+    assert transfer.allActions["receiver"]["TestAction"]
+    assert transfer.allActions["sender"]["TestAction"]
+    assert transfer.toCleanup == ["receiverURI", "senderURI"]
+
+
+def testTransferSessionProxyIsReleased():
+    logger = Logger("test logger", level=logging.DEBUG)
+    conf = ConfigFDTCopy("fdt://host1:123/tmp/file fdt://host2:124/tmp/file1".split())
+    conf.sanitize()
+    pool = Mock()
+    transfer = Transfer(conf, None, logger, pool=pool)
+    fdtCopy = Mock()
+    fdtCopy.call.return_value = dict(id="id1", role="sender", status=0, host="host1",
+                                     serverPort=None, uri="PYRO:obj_1@host1:123")
+    transfer.sender = fdtCopy
+    transfer._startSession(fdtCopy, "sender", dict(action="SendingClientAction"))
+    assert isinstance(transfer.allActions["sender"]["SendingClientAction"], Pyro4.Proxy)
+    with patch.object(Pyro4.Proxy, "_pyroRelease") as release:
+        transfer.releaseProxies()
+        assert release.called
+    pool.release.assert_called_once_with(fdtCopy)
+    assert transfer.allActions == {"receiver": {}, "sender": {}}
+
+
+def testTransferEngineLimits():
+    logger = Logger("test logger", level=logging.DEBUG)
+    conf = ConfigFDTCopy("fdt://host1:123/tmp/file fdt://host2:124/tmp/file1".split())
+    conf.sanitize()
+    running = []
+    maxRunning = []
+
+    class MockTransfer(object):
+        def __init__(self, hostPair, fail=False):
+            self.hostPair = hostPair
+            self.fail = fail
+            self.conf = conf
+            self.result = None
+            self.log = None
+            self.sender = self
+            self.uri = hostPair
+            self.polls = 0
+
+        def getHostPair(self):
+            return self.hostPair
+
+        def acquireProxies(self):
+            pass
+
+        def releaseProxies(self):
+            pass
+
+        def startTransfer(self):
+            running.append(self)
+            maxRunning.append(len(running))
+            if self.fail:
+                running.remove(self)
+                raise FDTCopyException("failed")
+            return self
+
+        def poll(self, senderServerExe):
+            self.polls += 1
+            if self.polls < 3:
+                return [{"STDOUT": "line %s\n" % self.polls}]
+            running.remove(self)
+            return [{"ReturnCode": 0, "Status": "SUCCESS"}]
+
+        def processOutput(self, outLine):
+            return "ReturnCode" in outLine
+
+        def prepareRetry(self):
+            return False
+
+        def performCleanup(self, waitTimeout=True):
+            pass
+
+    transfers = [MockTransfer("a-b"), MockTransfer("a-b"), MockTransfer("c-d", fail=True),
+                 MockTransfer("e-f"), MockTransfer("g-h")]
+    engine = TransferEngine(transfers, 3, 1, logger, workers=2, pollInterval=0.01)
+    assert engine.run() == 1
+    assert max(maxRunning) <= 3
+    assert [t.result for t in transfers] == [0, 0, 1, 0, 0]
+    assert running == []
+
+
+def testTransfersCopyJobFileMalformedLines():
+    # malformed lines do not stop processing of the rest of the file
+    data = """fdt://host1:111/tmp/file1  fdt://host5:222/tmp/fileX1
+
+fdt://host1:111/tmp/file2
+fdt://host1:111/tmp/file3  fdt://host5:22c/tmp/fileX3
+fdt://host1:111/tmp/file4  fdt://host5:222/tmp/fileX4
+"""
+    logger = Logger("test logger", level=logging.DEBUG)
+    copyJobFile = tempfile.NamedTemporaryFile("w+")  # read / write
+    copyJobFile.write(data)
+    copyJobFile.flush()
+
+    inputOption = "--copyjobfile=%s" % copyJobFile.name
+    conf = ConfigFDTCopy(inputOption.split())
+    transfers = Transfers(conf, None, logger)
+    assert len(transfers.transfers) == 1
+    assert transfers.transfers["host1:111-host5:222"].files == \
+        ["/tmp/file1 / /tmp/fileX1", "/tmp/file4 / /tmp/fileX4"]
+
+
+def testSplitBySize():
+    files = ["/a / /x/a", "/b / /x/b", "/c / /x/c", "/d / /x/d", "/e / /x/e"]
+    sizes = {"/a": 100, "/b": 10, "/c": 60, "/d": 40, "/e": None}
+    groups = splitBySize(files, sizes, 2)
+    assert groups == [["/a / /x/a", "/b / /x/b"], ["/c / /x/c", "/d / /x/d", "/e / /x/e"]]
+    # unknown sizes - split by number of files
+    groups = splitBySize(files, {}, 2)
+    assert sorted(len(group) for group in groups) == [2, 3]
+    # no more sessions than files
+    assert len(splitBySize(files[:2], sizes, 4)) == 2
+
+
+def testReportWriter():
+    logger = Logger("test logger", level=logging.DEBUG)
+    conf = ConfigFDTCopy("fdt://host1:123/tmp/file fdt://host2:124/tmp/file1".split())
+    conf.sanitize()
+    transfer = Transfer(conf, None, logger)
+    transfer.setUp("host1", "123", "host2", "124", "/tmp/file / /tmp/file1")
+    transfer.addFile("/tmp/fileA / /tmp/fileB")
+    transfer.result = 1
+    transfer.log = "first line\nsecond line"
+    reportFile = tempfile.NamedTemporaryFile("w+")
+    report = ReportWriter(reportFile.name)
+    report.write(transfer)
+    # reported only once
+    report.write(transfer)
+    # lines are available before the writer is closed
+    lines = open(reportFile.name).readlines()
+    assert lines == ["fdt://host1:/tmp/file  fdt://host2:/tmp/file1  1  first line second line\n",
+                     "fdt://host1:/tmp/fileA  fdt://host2:/tmp/fileB  1  first line second line\n"]
+    report.close()
+
+
+def testTransferPerFileResultsAndRetry():
+    logger = Logger("test logger", level=logging.DEBUG)
+    conf = ConfigFDTCopy("--retries 1 fdt://host1:123/tmp/file fdt://host2:124/tmp/file1".split())
+    conf.sanitize()
+    transfer = Transfer(conf, None, logger)
+    transfer.setUp("host1", "123", "host2", "124", "/tmp/fileA / /tmp/fileX")
+    transfer.addFile("/tmp/fileB / /tmp/fileY")
+    transfer.outputParser = FDTOutputParser(["/tmp/fileA", "/tmp/fileB"])
+    assert not transfer.processOutput({"STDOUT": "FileReaderSession [file=/tmp/fileA, "
+                                                 "partitionID=0, sessionID=a1, sessionSize=1]\n"})
+    assert not transfer.processOutput({"STDOUT": "No such file: /tmp/fileB\n"})
+    py.test.raises(FDTCopyException, transfer.processOutput,
+                   {"ReturnCode": 1, "Status": "FAILED"})
+    assert transfer.fileResults["/tmp/fileA / /tmp/fileX"] == (0, "size: 1 [B]")
+    assert transfer.fileResults["/tmp/fileB / /tmp/fileY"][0] == 1
+    transfer.result = 1
+    # only the failed file is retried, once
+    assert transfer.prepareRetry()
+    assert transfer.result is None
+    assert transfer.getPendingFiles() == ["/tmp/fileB / /tmp/fileY"]
+    assert not transfer.prepareRetry()
+
+    # a failing retry preparation does not escape, the status is returned
+    transfer.prepareRetry = Mock(side_effect=RuntimeError("broken"))
+    transfer.performTransfer = Mock(side_effect=FDTCopyException("failed"))
+    assert runTransfer(transfer, logger) == 1
+    assert transfer.result == 1
+
+    # fdtcp terminated by a signal, no retry
+    transfer.prepareRetry = Mock(return_value=True)
+    transfer.performTransfer = Mock(side_effect=FDTCopyShutdownBySignal("signal"))
+    py.test.raises(FDTCopyShutdownBySignal, runTransfer, transfer, logger)
+    assert not transfer.prepareRetry.called
+
+    def steps():
+        yield None
+    engine = TransferEngine([transfer], 1, 1, logger)
+    coroutine = steps()
+    next(coroutine)
+    engine.running[coroutine] = transfer
+    try:
+        raise FDTCopyShutdownBySignal("signal")
+    except FDTCopyShutdownBySignal:
+        excInfo = sys.exc_info()
+    py.test.raises(FDTCopyShutdownBySignal, engine._resume, coroutine, None, excInfo)
+    assert not transfer.prepareRetry.called
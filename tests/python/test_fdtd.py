@@ -17,6 +17,7 @@ from builtins import range
 from builtins import object
 
 
+import imp
 import os
 import sys
 import tempfile
@@ -25,30 +26,42 @@ import logging
 import time
 import tempfile
 import inspect
+import threading
 
 import psutil
 from psutil import Process, NoSuchProcess
 import py.test
 from mock import Mock
+import Pyro4
+import Pyro4.core
+import Pyro4.util
 
-from fdtcplib.fdtd import FDTD
-from fdtcplib.fdtd import daemonize
-from fdtcplib.fdtd import FDTDService
-from fdtcplib.fdtd import ConfigFDTD
-from fdtcplib.fdtd import AuthService
-from fdtcplib.fdtd import PortReservation
 from fdtcplib.common.errors import FDTDException, AuthServiceException
+from fdtcplib.common.errors import ServiceBusyException
 from fdtcplib.common.errors import PortReservationException
 from fdtcplib.utils.utils import getUserName
 from fdtcplib.utils.Logger import Logger
 from fdtcplib.utils.Executor import Executor
 from fdtcplib.utils.utils import getOpenFilesList
-from fdtcplib.common.TransferFile import TransferFile
-from fdtcplib.common.actions import TestAction, ReceivingServerAction
-from fdtcplib.common.actions import SendingClientAction
-from fdtcplib.common.actions import CleanupProcessesAction
+from fdtcplib.common.TestAction import TestAction
+from fdtcplib.common.ReceivingServerAction import ReceivingServerAction
+from fdtcplib.common.SendingClientAction import SendingClientAction
+from fdtcplib.common.CleanupProcessesAction import CleanupProcessesAction
 from fdtcplib.utils.Config import ConfigurationException
-from fdtcplib.utils.utils import getOpenFilesList
+
+# fdtd is a script (no .py suffix), load it as a module
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "src", "python")
+fdtdModule = imp.load_source("fdtd", os.path.join(SRC_DIR, "fdtd"))
+FDTD = fdtdModule.FDTD
+daemonize = fdtdModule.daemonize
+FDTDService = fdtdModule.FDTDService
+ConfigFDTD = fdtdModule.ConfigFDTD
+AuthService = fdtdModule.AuthService
+PortReservation = fdtdModule.PortReservation
+ReceivingServerPool = fdtdModule.ReceivingServerPool
+AdmissionControl = fdtdModule.AdmissionControl
+parseSerializers = fdtdModule.parseSerializers
+ActionRegistry = fdtdModule.ActionRegistry
 
 
 def getTempFile(content):
@@ -362,8 +375,8 @@ exit 0
         daemon.shutdown()
         daemon.pyroDaemon.closedown()
 
-    # the process was still running, timeout elapsed and was killed
-    assert e.proc.poll() == -9
+    # the process was still running, timeout elapsed and was terminated
+    assert e.proc.poll() == -signal.SIGTERM
 
     # try different port, even if the previous was released,
     # immediate rebinding attempt makes PYRO fail
@@ -392,6 +405,51 @@ exit 0
     assert e.proc.poll() == 0
 
 
+def testKillProcessGroupEscalation():
+    c = """
+[general]
+port = 6700
+debug = DEBUG
+killGraceTime = 1
+portRangeFDTServer = 54321,54400
+"""
+    # ignored SIGTERM is inherited by the child (sleep) in the same group,
+    # the process is killed only once the trap is installed
+    script = """
+trap "" TERM
+echo ready
+sleep 30
+"""
+    f = getTempFile(c)
+    inputOption = "--config=%s" % f.name
+    conf = ConfigFDTD(inputOption.split())
+    testName = inspect.stack()[0][3]
+    logger = Logger(name=testName, level=logging.DEBUG)
+    apMon = None
+    daemon = FDTD(conf, apMon, logger)
+
+    f = getTempFile(script)
+    e = Executor("some_id",
+                 "bash %s" % f.name,
+                 caller=daemon,
+                 killTimeout=0,
+                 logOutputToWaitFor="ready",
+                 logOutputWaitTime=10,
+                 logger=logger)
+    try:
+        e.execute()
+        # the process is the leader of its own process group
+        assert os.getpgid(e.proc.pid) == e.proc.pid
+        startTime = time.time()
+        daemon.killProcess("some_id", logger)
+        # SIGTERM ignored, SIGKILL after the grace period
+        assert time.time() - startTime < 10
+    finally:
+        daemon.shutdown()
+        daemon.pyroDaemon.close()
+    assert e.proc.poll() == -signal.SIGKILL
+
+
 def testFDTDWaitingTimeoutWhenCleanup():
     """
     Test issues long running job (dd copy) on the background (non-blocking)
@@ -799,7 +857,7 @@ def testFDTDServiceOpenFilesFullTransfer():
     testActionReader.id = testActionReader.id + "-reader"
     r = fdtdReader.service.service(testActionReader)
     assert r.status == 0
-    files = [TransferFile("/etc/passwd", "/dev/null")]  # list of TransferFile
+    files = ["/etc/passwd / /dev/null"]
     options = dict(port=serverFDTPort,
                    hostDest=os.uname()[1],
                    transferFiles=files,
@@ -920,3 +978,265 @@ pidFile = /tmp/fdtd.pid
     # duplication as done in fdtd.daemonization() but now, once is
     # closed, there should not any other outstanding open file
     assert numFiles == 0
+
+
+def testPortReservationLeastRecentlyReleasedFirst():
+    portMgmt = PortReservation(54321, 54325)
+    ports = [portMgmt.reserve() for i in range(5)]
+    assert ports == list(range(54321, 54326))
+    py.test.raises(PortReservationException, portMgmt.reserve)
+    portMgmt.release(54323)
+    portMgmt.release(54321)
+    py.test.raises(PortReservationException, portMgmt.release, 54321)
+    py.test.raises(PortReservationException, portMgmt.release, "aa")
+    # released ports come back in the order of release
+    assert portMgmt.reserve() == 54323
+    assert portMgmt.reserve() == 54321
+    assert portMgmt.numTakenPorts == 5
+
+
+def testPortReservationQuarantinesPortsInUse():
+    import socket
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("", 0))
+    sock.listen(1)
+    busyPort = sock.getsockname()[1]
+    portMgmt = PortReservation(busyPort, busyPort + 1, checkBind=True, quarantineTime=60)
+    try:
+        # the port held by the listening socket is skipped
+        assert portMgmt.reserve() == busyPort + 1
+        assert portMgmt.numTakenPorts == 1
+        py.test.raises(PortReservationException, portMgmt.reserve)
+    finally:
+        sock.close()
+    # still in quarantine, though it can be bound now
+    py.test.raises(PortReservationException, portMgmt.reserve)
+    portMgmt.quarantineTime = 0
+    portMgmt.quarantine(busyPort)
+    assert portMgmt.reserve() == busyPort
+
+
+def testPortReservationReleasesPortOnCheckError():
+    portMgmt = PortReservation(54321, 54321, checkBind=True)
+    isPortBindable = fdtdModule.isPortBindable
+    fdtdModule.isPortBindable = Mock(side_effect=RuntimeError("check failed"))
+    try:
+        py.test.raises(RuntimeError, portMgmt.reserve)
+    finally:
+        fdtdModule.isPortBindable = isPortBindable
+    # the port did not leak
+    assert portMgmt.numTakenPorts == 0
+    assert portMgmt.reserve() == 54321
+
+
+def testReceivingServerPool():
+    class MockPool(ReceivingServerPool):
+        def _startServer(self, idE, key):
+            started.append((idE, key))
+            exe = Mock()
+            exe.id = idE
+            exe.port = 54321 + len(started)
+            exe.poll.return_value = None
+            return exe
+
+    def waitStarted(count):
+        startTime = time.time()
+        while (len(started) < count or
+               sum(len(queue) for queue in pool.servers.values()) != pool.total):
+            assert time.time() - startTime < 5
+            time.sleep(0.01)
+
+    started = []
+    fdtd = Mock()
+    pool = MockPool(fdtd, 2, 300, clients=[("10.0.0.1", "user1")])
+    pool.start()
+    waitStarted(2)
+    assert [key for dummyId, key in started] == 2 * [("10.0.0.1", "user1")]
+    # servers are handed out only to the client they were started for
+    assert pool.take("10.0.0.2", "user1") is None
+    assert pool.take("10.0.0.1", "user2") is None
+    exe = pool.take("10.0.0.1", "user1")
+    assert exe.id == started[0][0]
+    # refilled
+    waitStarted(3)
+    assert started[2][1] == ("10.0.0.1", "user1")
+    # expired servers are killed, not handed out
+    pool.ttl = 0
+    time.sleep(0.01)
+    pool.stop()
+    assert pool.take("10.0.0.1", "user1") is None
+    assert fdtd.killProcess.call_count == 2
+    assert pool.total == 0
+
+
+def testReceivingServerActionTakesWarmServer():
+    caller = Mock()
+    exe = Mock()
+    exe.id = "warm-server-1"
+    exe.port = 54321
+    caller.takeWarmServer.return_value = exe
+    options = dict(transferId="id1", monID="mon1", clientIP="10.0.0.1",
+                   gridUserDest="user1", destFiles=["/tmp/file1"],
+                   conf=Mock(), caller=caller, apmonObj=None, logger=Mock())
+    action = ReceivingServerAction(options)
+    action._checkTargetFileNames = Mock(return_value="")
+    result = action.execute()
+    assert result.serverPort == 54321
+    caller.takeWarmServer.assert_called_once_with("id1", "10.0.0.1", "user1")
+    # presence of the target files is checked for warm servers too
+    action._checkTargetFileNames.assert_called_once_with(["/tmp/file1"])
+
+
+def testAdmissionControl():
+    logger = Mock()
+    admission = AdmissionControl(maxReceivers=1, maxStreams=4, streamsPerSession=2,
+                                 queueLength=1, queueTimeout=5, retryAfter=30)
+    admission.admit("id1", "receiver", logger)
+    # stream limit allows one more (sender) session
+    admission.admit("id2", "sender", logger)
+    admitted = []
+
+    def waiter():
+        admission.admit("id3", "sender", logger)
+        admitted.append("id3")
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    startTime = time.time()
+    while not admission.queue:
+        assert time.time() - startTime < 5
+        time.sleep(0.01)
+    # queue is full
+    ex = py.test.raises(ServiceBusyException, admission.admit, "id4", "receiver", logger)
+    assert ex.value.retryAfter == 30
+    assert admitted == []
+    # the waiting request is admitted once a session finishes
+    admission.release("id1")
+    thread.join(5)
+    assert admitted == ["id3"]
+    assert admission.running == {"receiver": 0, "sender": 2}
+    # refused after queueTimeout
+    admission.queueTimeout = 0.1
+    py.test.raises(ServiceBusyException, admission.admit, "id5", "sender", logger)
+    assert not admission.queue
+    # the same request id admitted as both receiver and sender (local transfer)
+    admission.release("id2", "sender")
+    admission.admit("id3", "receiver", logger)
+    assert admission.running == {"receiver": 1, "sender": 1}
+    admission.release("id3", "receiver")
+    assert admission.running == {"receiver": 0, "sender": 1}
+    admission.release("id3")
+    assert admission.running == {"receiver": 0, "sender": 0}
+    assert not admission.admitted
+
+
+def testServiceClosesLoggerOfRefusedRequest():
+    conf = Mock()
+    conf.get.side_effect = lambda name: name == "transferSeparateLogFile"
+    fdtd = Mock()
+    fdtd.admission.admit.side_effect = ServiceBusyException("busy", retryAfter=30)
+    service = FDTDService(Mock(), conf, None, fdtd)
+    transferLogger = Mock()
+    service.getSeparateLogger = Mock(return_value=transferLogger)
+    service.updateAction = Mock()
+    action = dict(action="ReceivingServerAction", id="id1", transferId="id1")
+    py.test.raises(ServiceBusyException, service.service, action)
+    assert transferLogger.close.called
+    assert not fdtd.admission.release.called
+
+
+def testPyroServerConfiguration():
+    c = """
+[general]
+port = 6700
+debug = DEBUG
+portRangeFDTServer = 54321,54400
+pyroServerType = multiplex
+pyroThreadPoolMin = 2
+pyroThreadPoolMax = 8
+pyroSerializers = serpent, json
+"""
+    f = getTempFile(c)
+    inputOption = "--config=%s" % f.name
+    conf = ConfigFDTD(inputOption.split())
+    testName = inspect.stack()[0][3]
+    logger = Logger(name=testName, level=logging.DEBUG)
+    apMon = None
+    daemon = FDTD(conf, apMon, logger)
+    try:
+        assert Pyro4.config.SERVERTYPE == "multiplex"
+        assert Pyro4.config.THREADPOOL_SIZE_MIN == 2
+        assert Pyro4.config.THREADPOOL_SIZE == 8
+        assert Pyro4.config.SERIALIZERS_ACCEPTED == set(["serpent", "json"])
+        assert "service" in Pyro4.util.get_exposed_members(FDTDService)["methods"]
+    finally:
+        daemon.shutdown()
+        daemon.pyroDaemon.close()
+        Pyro4.config.reset()
+    # PYRO defaults
+    assert parseSerializers(None) == set(["serpent", "marshal", "json"])
+
+
+def testActionRegistry():
+    fdtd = Mock()
+    fdtd.pyroDaemon = Pyro4.core.Daemon(host="localhost")
+    fdtd.apMon = None
+    running = set(["t2"])
+    fdtd.getExecutor.side_effect = lambda transferId: transferId in running
+    registry = ActionRegistry(fdtd, 3600)
+    options = dict(hostSrc="src", hostDest="dest", timeout=10)
+    actions = [TestAction(options) for dummy in range(3)]
+    try:
+        for action, transferId in zip(actions, ["t1", "t1", "t2"]):
+            uri = registry.register(action, transferId)
+            assert uri.object == action._pyroId
+        assert registry.getMetrics()["registered"] == 3
+        # clean up of the transfer
+        assert registry.unregisterTransfer("t1") == 2
+        assert actions[0]._pyroId not in fdtd.pyroDaemon.objectsById
+        assert list(registry.transfers.keys()) == ["t2"]
+        # not expired yet
+        registry.sweep()
+        assert len(registry.objects) == 1
+        # expired, but the transfer still runs a process
+        registry.ttl = 0
+        time.sleep(0.01)
+        registry.sweep()
+        assert len(registry.objects) == 1
+        running.clear()
+        registry.sweep()
+        metrics = registry.getMetrics()
+        assert metrics["registered"] == 0
+        assert metrics["unregisteredTotal"] == 3
+        assert metrics["expiredTotal"] == 1
+        assert metrics["rss"] > 0
+        assert not registry.transfers
+    finally:
+        fdtd.pyroDaemon.close()
+
+
+def testActionRegistryEmptyAfterCleanup():
+    fdtd = Mock()
+    fdtd.pyroDaemon = Pyro4.core.Daemon(host="localhost")
+    fdtd.getExecutor.return_value = None
+    conf = Mock()
+    conf.get.return_value = None
+    fdtd.actionRegistry = ActionRegistry(fdtd, 3600)
+    service = FDTDService(Mock(), conf, None, fdtd)
+    try:
+        testAction = dict(action="TestAction", hostSrc="src", hostDest="dest",
+                          timeout=10, transferId="t1")
+        service.service(testAction)
+        assert len(fdtd.actionRegistry.objects) == 1
+        cleanup = dict(action="CleanupProcessesAction", transferId="t1",
+                       timeout=10, waitTimeout=False)
+        reply = service.service(cleanup)
+        assert reply["status"] == 0
+        assert reply["id"] == "t1"
+        fdtd.killProcess.assert_called_once()
+        # the clean up action itself is not registered either
+        assert not fdtd.actionRegistry.objects
+        assert not fdtd.actionRegistry.transfers
+        assert fdtd.actionRegistry.getMetrics()["registered"] == 0
+    finally:
+        fdtd.pyroDaemon.close()
@@ -10,15 +10,18 @@ from builtins import object
 
 import os
 import sys
+import errno
 import signal
 import tempfile
 import time
+import threading
 
 import py.test
 from mock import Mock
 
 from fdtcplib.utils.Logger import Logger
 from fdtcplib.utils.Executor import Executor, ExecutorException
+from fdtcplib.utils.OutputSupervisor import OutputSupervisor
 
 
 class MockCaller(object):
@@ -283,3 +286,175 @@ sleep 1
     time.sleep(1)
     # by now it shall be finished
     assert e.proc.poll() == 0
+
+
+def testExecutorPollLogOut():
+    # Executor splits the command on white spaces, no shell quoting
+    script = getTempFile("echo out1; echo err1 >&2; sleep 1; printf out2")
+    e = Executor("some_id", "sh %s" % script.name, caller=MockCaller())
+    e.execute()
+    outLines = []
+    startTime = time.time()
+    while not outLines or "ReturnCode" not in outLines[-1]:
+        outLines.extend(e.pollLogOut())
+        # never blocks for the whole run of the command
+        assert time.time() - startTime < 5
+        time.sleep(0.1)
+    assert {"STDOUT": "out1\n"} in outLines
+    assert {"STDERR": "err1\n"} in outLines
+    assert {"STDOUT": "out2"} in outLines
+    assert outLines[-1]["ReturnCode"] == 0
+    assert outLines[-1]["Status"] == "SUCCESS"
+
+
+def testExecutorWaitsForReadiness():
+    script = getTempFile("echo starting; sleep 0.5; echo listening on 1234; sleep 5")
+    e = Executor("some_id", "sh %s" % script.name,
+                 logOutputToWaitFor="listening on 1234", logOutputWaitTime=10)
+    startTime = time.time()
+    output = e.execute()
+    # returns as soon as the line appears, not after the wait time
+    assert time.time() - startTime < 5
+    assert "starting\n" in output
+    assert 0.4 < e.readyTime < 5
+    assert e.poll() is None
+    e.proc.kill()
+
+    # startup failure is reported as soon as the process finishes
+    script = getTempFile("echo Address already in use; exit 1")
+    e = Executor("some_id", "sh %s" % script.name,
+                 logOutputToWaitFor="listening on 1234", logOutputWaitTime=10)
+    startTime = time.time()
+    ex = py.test.raises(ExecutorException, e.execute)
+    assert time.time() - startTime < 5
+    assert "Address already in use" in str(ex.value)
+    assert e.readyTime is None
+
+
+def testExecutorWithLogOutBatches():
+    # many lines at once, then a partial line which must not stall the stream
+    script = getTempFile("seq 1 1000; printf partial; sleep 1; echo ' end'")
+    e = Executor("some_id", "sh %s" % script.name, caller=MockCaller())
+    e.execute()
+    batches = []
+    startTime = time.time()
+    for batch in e.executeWithLogOut():
+        batches.append((time.time() - startTime, batch))
+        # syncFlag is set while the output is being pushed
+        assert e.syncFlag
+    assert not e.syncFlag
+    # the burst of lines arrives in a batch or few, not line by line
+    assert len(batches) < 10
+    outLines = [item for dummy, batch in batches for item in batch]
+    assert outLines[0] == {"STDOUT": "1\n"}
+    assert {"STDOUT": "1000\n"} in outLines
+    assert {"STDOUT": "partial end\n"} in outLines
+    # the lines before the partial one were sent before the process ended
+    assert batches[0][0] < 0.9
+    assert outLines[-1]["ReturnCode"] == 0
+    assert outLines[-1]["Status"] == "SUCCESS"
+
+
+def testExecutorGetLogsKeepsOutputTail():
+    script = getTempFile("seq 1 1000; echo failure >&2; exit 2")
+    e = Executor("some_id", "sh %s" % script.name, caller=MockCaller(),
+                 outputBufferSize=20)
+    e.execute()
+    outLines = []
+    for batch in e.executeWithLogOut():
+        outLines.extend(batch)
+    assert outLines[-1]["ReturnCode"] == 2
+    logs = e.getLogs()
+    # the tail of each stream, earlier output discarded
+    assert "stdout:\n<3873 bytes of earlier output discarded>\n" in logs
+    assert "\n997\n998\n999\n1000\n" in logs
+    assert "\n1\n" not in logs
+    assert "stderr:\nfailure\n" in logs
+
+
+def testExecutorDrainsOutputAfterReadiness():
+    # more output than a pipe holds once the server is ready, nobody reads it
+    script = getTempFile("echo listening; sleep 0.2; seq 1 100000; echo the end")
+    e = Executor("some_id", "sh %s" % script.name, caller=MockCaller(),
+                 logOutputToWaitFor="listening", logOutputWaitTime=10)
+    e.execute()
+    # the process does not block on a full pipe
+    assert e.wait(10) == 0
+    startTime = time.time()
+    while e.partialLines["STDOUT"] is not None:
+        assert time.time() - startTime < 5
+        time.sleep(0.01)
+    # getLogs() has the tail, not the start up output
+    assert "\n100000\nthe end\n" in e.getLogs()
+
+
+def testExecutorSupervisorBackend():
+    script = getTempFile("echo out1; echo err1 >&2; sleep 0.5; printf out2")
+    e = Executor("some_id", "sh %s" % script.name, caller=MockCaller(),
+                 backend="supervisor")
+    e.execute()
+    outLines = []
+    for batch in e.executeWithLogOut():
+        outLines.extend(batch)
+    assert {"STDOUT": "out1\n"} in outLines
+    assert {"STDERR": "err1\n"} in outLines
+    assert {"STDOUT": "out2"} in outLines
+    assert outLines[-1]["ReturnCode"] == 0
+    assert outLines[-1]["Status"] == "SUCCESS"
+
+    # output nobody reads is drained, the process doesn't block on a full
+    # pipe, only the pending lines over the limit are discarded
+    script = getTempFile("seq 1 300000")
+    e = Executor("some_id", "sh %s" % script.name, caller=MockCaller(),
+                 backend="supervisor")
+    e.execute()
+    assert e.wait(10) == 0
+    startTime = time.time()
+    while e.partialLines["STDOUT"] is not None:
+        assert time.time() - startTime < 5
+        time.sleep(0.01)
+    assert e.numDiscardedLines > 0
+    assert e.pendingSize <= 1048576
+    assert "\n299999\n300000\n" in e.getLogs()
+    py.test.raises(ExecutorException, Executor, "some_id", "true", backend="unknown")
+
+
+def testOutputSupervisorSurvivesErrors():
+    supervisor = OutputSupervisor(logger=Mock())
+    calls = []
+    retried = threading.Event()
+
+    def readNext():
+        calls.append(len(calls))
+        if len(calls) == 1:
+            raise IOError(errno.EIO, "I/O error")
+        retried.set()
+        time.sleep(1)
+
+    supervisor._readNext = readNext
+    thread = threading.Thread(target=supervisor._run)
+    thread.setDaemon(True)
+    thread.start()
+    # the error is logged, the loop goes on
+    assert retried.wait(5)
+    assert supervisor.logger.error.called
+    assert thread.is_alive()
+
+
+def testExecutorResourceUsage():
+    script = getTempFile("i=0; while [ $i -lt 100000 ]; do i=$((i+1)); done")
+    e = Executor("some_id", "sh %s" % script.name, caller=MockCaller(),
+                 resourceSampleInterval=0.1)
+    assert e.getResourceUsage() is None
+    e.execute()
+    outLines = []
+    for batch in e.executeWithLogOut():
+        outLines.extend(batch)
+    usage = outLines[-1]["ResourceUsage"]
+    assert usage["finished"]
+    assert usage["cpuUser"] + usage["cpuSystem"] > 0
+    assert usage["peakRss"] > 0
+    assert usage["voluntaryCtxSwitches"] + usage["involuntaryCtxSwitches"] > 0
+    # rusage collected at the exit by the process reaper
+    assert e.proc.rusage.ru_utime + e.proc.rusage.ru_stime > 0
+    assert e.getResourceUsage() == usage
@@ -0,0 +1,46 @@
+"""
+py.test unittest testsuite for the FDTOutputParser module.
+
+"""
+from fdtcplib.utils.FDTOutputParser import FDTOutputParser
+
+
+def testFDTOutputParserSuccess():
+    p = FDTOutputParser(["/data/file1", "/data/file2"])
+    p.parse("FileReaderSession [file=/data/file1, partitionID=0, sessionID=a1, sessionSize=1024]\n")
+    p.parse("[ HANDLED ] Got exception returning buffers to pool\n")
+    p.parse(" Exit Status: OK\n")
+    assert p.sizes == {"/data/file1": 1024}
+    assert p.getResults(0) == {"/data/file1": (0, "size: 1024 [B]"), "/data/file2": (0, "")}
+
+
+def testFDTOutputParserFileError():
+    p = FDTOutputParser(["/data/file1", "/data/file2", "/data/file3"])
+    p.parse("FileReaderSession [file=/data/file1, partitionID=0, sessionID=a1, sessionSize=10]\n")
+    p.parse("java.io.FileNotFoundException: No such file: /data/file2\n")
+    p.parse(" Exit Status: Not OK\n")
+    p.parse("The FDTReaderSession ( a1 ) finished with error(s). downMsg: null\n")
+    results = p.getResults(1)
+    assert results["/data/file1"] == (0, "size: 10 [B]")
+    assert results["/data/file2"][0] == 1
+    assert "No such file" in results["/data/file2"][1]
+    # FDT Java failed before the completion of the file was reported
+    assert results["/data/file3"][0] == 1
+    assert "return code: 1" in results["/data/file3"][1]
+
+
+def testFDTOutputParserSessionError():
+    p = FDTOutputParser(["/data/file1", "/data/file2", "/data/file3"])
+    p.parse("The specified name [ /data/file1 ] is not a file!\n")
+    p.parse("FileReaderSession [file=/data/file3, partitionID=0, sessionID=a1, sessionSize=5]\n")
+    p.parse("java.net.ConnectException: Connection refused\n")
+    results = p.getResults(1)
+    # error not related to a file - outcome of the other files is unknown
+    assert results["/data/file1"][0] == 1
+    assert results["/data/file2"][0] == 1
+    assert "Connection refused" in results["/data/file2"][1]
+    # completed before the connection was lost
+    assert results["/data/file3"] == (0, "size: 5 [B]")
+    # failed without any explanation
+    p = FDTOutputParser(["/data/file1"])
+    assert p.getResults(1)["/data/file1"][0] == 1
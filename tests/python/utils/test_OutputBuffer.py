@@ -0,0 +1,26 @@
+"""
+py.test unittest testsuite for the OutputBuffer module.
+
+"""
+from fdtcplib.utils.OutputBuffer import OutputBuffer
+
+
+def testOutputBufferKeepsTail():
+    buf = OutputBuffer(10)
+    buf.append("abc\n")
+    buf.append("")
+    assert buf.getValue() == "abc\n"
+    assert str(buf) == "abc\n"
+    buf.append("defgh\n")
+    assert buf.getValue() == "abc\ndefgh\n"
+    # the oldest chunk is cut
+    buf.append("ij\n")
+    assert buf.getValue() == "\ndefgh\nij\n"
+    assert buf.size == 10
+    assert buf.discarded == 3
+    assert str(buf) == "<3 bytes of earlier output discarded>\n\ndefgh\nij\n"
+    # a chunk larger than the buffer
+    buf.append("0123456789XYZ")
+    assert buf.getValue() == "3456789XYZ"
+    assert buf.discarded == 16
+    assert len(buf.chunks) == 1
@@ -0,0 +1,63 @@
+"""
+py.test unittest testsuite for the Placement module.
+
+"""
+import time
+
+import py.test
+import psutil
+
+from fdtcplib.utils.Placement import PlacementPolicy, Placement, parseCpuList
+from fdtcplib.utils.Executor import Executor
+
+
+def testParseCpuList():
+    assert parseCpuList("0-3,8, 10-11") == [0, 1, 2, 3, 8, 10, 11]
+    py.test.raises(ValueError, parseCpuList, ",")
+    py.test.raises(ValueError, parseCpuList, "a-b")
+
+
+def testPlacementPolicyRoundRobin():
+    conf = {"senderCpuSets": "0-1;2-3", "senderNumaNodes": "0;1",
+            "senderIoniceClass": "best-effort", "senderIoniceLevel": "4"}
+    policy = PlacementPolicy.fromConf(conf, "sender")
+    placements = [policy.next() for dummy in range(3)]
+    assert [(p.cpus, p.numaNode) for p in placements] == [([0, 1], 0), ([2, 3], 1),
+                                                         ([0, 1], 0)]
+    assert placements[0].ioniceLevel == 4
+    assert (placements[1].wrapCommand("fdt.sh -p 1") ==
+            "ionice -c 2 -n 4 numactl --membind=1 --physcpubind=2,3 fdt.sh -p 1")
+    assert (Placement(numaNode=0).wrapCommand("fdt.sh") ==
+            "numactl --membind=0 --cpunodebind=0 fdt.sh")
+    assert Placement(cpus=[0, 1]).wrapCommand("fdt.sh") == "taskset -c 0,1 fdt.sh"
+    assert (Placement(ioniceClass="best-effort", ioniceLevel=4, nice=5).wrapCommand("fdt.sh") ==
+            "nice -n 5 ionice -c 2 -n 4 fdt.sh")
+    assert Placement(ioniceClass="idle").wrapCommand("fdt.sh") == "ionice -c 3 fdt.sh"
+    assert Placement().wrapCommand("fdt.sh") == "fdt.sh"
+    # no policy for receivers
+    assert PlacementPolicy.fromConf(conf, "receiver") is None
+    py.test.raises(ValueError, PlacementPolicy.fromConf,
+                   {"senderCpuSets": "0;1", "senderNumaNodes": "0"}, "sender")
+    py.test.raises(ValueError, PlacementPolicy.fromConf,
+                   {"senderIoniceClass": "fast"}, "sender")
+    py.test.raises(ValueError, PlacementPolicy.fromConf, {"senderNice": "40"}, "sender")
+
+
+def testExecutorAppliesPlacement():
+    cpu = psutil.Process().cpu_affinity()[-1]
+    placement = Placement(cpus=[cpu], ioniceClass="idle", nice=7)
+    e = Executor("some_id", "sleep 5", placement=placement)
+    e.execute()
+    try:
+        proc = psutil.Process(e.proc.pid)
+        # nice, ionice and taskset exec the command in turn
+        startTime = time.time()
+        while proc.cmdline()[:1] != ["sleep"]:
+            assert time.time() - startTime < 5
+            time.sleep(0.01)
+        assert proc.cpu_affinity() == [cpu]
+        assert proc.ionice().ioclass == psutil.IOPRIO_CLASS_IDLE
+        assert proc.nice() == 7
+    finally:
+        e.proc.kill()
+        e.wait()
@@ -0,0 +1,39 @@
+"""
+py.test unittest testsuite for the PortOwners module.
+
+"""
+import os
+import socket
+import time
+
+from fdtcplib.utils.PortOwners import PortOwnerLookup
+
+
+def testPortOwnerLookup():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("", 0))
+    sock.listen(1)
+    port = sock.getsockname()[1]
+    lookup = PortOwnerLookup(ttl=60)
+    try:
+        assert lookup.getOwners(port) == [(os.getpid(), "LISTEN")]
+    finally:
+        sock.close()
+    # cached result
+    assert lookup.getOwners(port) == [(os.getpid(), "LISTEN")]
+    assert lookup.getOwners(port, refresh=True) == []
+
+
+def testPortOwnerLookupTables(tmpdir):
+    proc = tmpdir.mkdir("proc")
+    header = "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+    proc.mkdir("net").join("tcp").write(
+        header +
+        "   0: 00000000:1F90 00000000:0000 0A 00000000:00000000 00:00000000 00000000  0 0 4242 1\n"
+        "   1: 0100007F:1F90 0100007F:D431 06 00000000:00000000 03:00000ABC 00000000  0 0 0 3\n")
+    fdDir = proc.mkdir("123").mkdir("fd")
+    os.symlink("socket:[4242]", str(fdDir.join("5")))
+    os.symlink("/dev/null", str(fdDir.join("0")))
+    lookup = PortOwnerLookup(procDir=str(proc))
+    assert lookup.getOwners(8080) == [(123, "LISTEN"), (None, "TIME_WAIT")]
+    assert lookup.getOwners(8081) == []
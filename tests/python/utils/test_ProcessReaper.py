@@ -0,0 +1,94 @@
+"""
+py.test unittest testsuite for the ProcessReaper module.
+
+"""
+import errno
+import subprocess
+import threading
+import time
+
+from mock import patch
+
+from fdtcplib.utils.ProcessReaper import ProcessReaper, getReaper
+from fdtcplib.utils.ProcessReaper import LOST_RETURNCODE
+
+
+def testProcessReaperWaitTimeout():
+    reaper = getReaper()
+    proc = subprocess.Popen(["sleep", "5"])
+    reaper.watch(proc)
+    startTime = time.time()
+    assert reaper.wait(proc, 0.2) is None
+    assert time.time() - startTime < 2
+    proc.kill()
+    assert reaper.wait(proc) == -9
+
+
+def testProcessReaperWakesUpWaiters():
+    reaper = getReaper()
+    proc = subprocess.Popen(["sh", "-c", "sleep 0.5; exit 3"])
+    reaper.watch(proc)
+    results = []
+
+    def waiter():
+        results.append(reaper.wait(proc, 10))
+
+    threads = [threading.Thread(target=waiter) for dummy in range(3)]
+    startTime = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # woken up on the process exit, not after the timeout
+    assert time.time() - startTime < 5
+    assert results == [3, 3, 3]
+    assert proc.poll() == 3
+
+
+def testProcessReaperUnregisteredChild():
+    class MockProc(object):
+        pid = 12345
+        returncode = None
+
+    reaper = ProcessReaper()
+    proc = MockProc()
+    # reaped (exit code 1) before it was registered
+    reaper.unclaimed[proc.pid] = (1 << 8, None)
+    reaper.watch(proc)
+    assert proc.returncode == 1
+    assert reaper.wait(proc, 0) == 1
+
+
+def testProcessReaperSurvivesWaitErrors():
+    class MockProc(object):
+        pid = 12345
+        returncode = None
+
+    results = [OSError(errno.EIO, "I/O error"), (MockProc.pid, 2 << 8, None)]
+
+    def wait4(pid, options):
+        result = results.pop(0) if results else OSError(errno.ECHILD, "No child")
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    reaper = ProcessReaper()
+    proc = MockProc()
+    with patch("os.wait4", wait4):
+        reaper.watch(proc)
+        # the error is retried, the thread keeps reaping
+        assert reaper.wait(proc, 10) == 2
+
+
+def testProcessReaperLostStatusIsFailure():
+    class MockProc(object):
+        pid = 12345
+        returncode = None
+
+    reaper = ProcessReaper()
+    proc = MockProc()
+    reaper.procs[proc.pid] = proc
+    # no child to wait for, the process was reaped elsewhere
+    reaper._lost()
+    assert proc.returncode == LOST_RETURNCODE
+    assert not reaper.procs
@@ -0,0 +1,91 @@
+"""
+py.test unittest testsuite for the ResourceUsage module.
+
+"""
+import os
+import resource
+import shutil
+import tempfile
+
+from fdtcplib.utils.ResourceUsage import CLOCK_TICKS
+from fdtcplib.utils.ResourceUsage import readProcessGroups, readProcessUsage
+from fdtcplib.utils.ResourceUsage import ResourceAccount, ResourceMonitor
+from fdtcplib.utils.ResourceUsage import formatUsage
+
+
+STATUS = """Name:\tjava
+VmHWM:\t    2048 kB
+VmRSS:\t    1024 kB
+voluntary_ctxt_switches:\t10
+nonvoluntary_ctxt_switches:\t2
+"""
+IO = """rchar: 100
+read_bytes: 4096
+write_bytes: 8192
+"""
+
+
+def makeProc(procDir, pid, pgid, utime, stime, io=IO):
+    pidDir = os.path.join(procDir, str(pid))
+    os.mkdir(pidDir)
+    # process name with spaces and parentheses
+    stat = ("%s (java (x) y) S 1 %s %s 0 -1 0 0 0 0 0 %s %s 0 0 20 0 1 0\n" %
+            (pid, pgid, pgid, utime, stime))
+    open(os.path.join(pidDir, "stat"), "w").write(stat)
+    open(os.path.join(pidDir, "status"), "w").write(STATUS)
+    if io:
+        open(os.path.join(pidDir, "io"), "w").write(io)
+
+
+def testReadProcessUsage():
+    procDir = tempfile.mkdtemp()
+    try:
+        makeProc(procDir, 100, 100, 3 * CLOCK_TICKS, CLOCK_TICKS)
+        makeProc(procDir, 101, 100, 0, 0, io=None)
+        makeProc(procDir, 200, 200, 0, 0)
+        os.mkdir(os.path.join(procDir, "self"))
+        assert readProcessGroups(procDir) == {100: [100, 101], 200: [200]} or \
+            readProcessGroups(procDir) == {100: [101, 100], 200: [200]}
+        usage = readProcessUsage(100, procDir)
+        assert usage == dict(cpuUser=3, cpuSystem=1, rss=1048576, peakRss=2097152,
+                             voluntaryCtxSwitches=10, involuntaryCtxSwitches=2,
+                             readBytes=4096, writeBytes=8192)
+        # io not readable
+        assert "readBytes" not in readProcessUsage(101, procDir)
+        assert readProcessUsage(300, procDir) is None
+
+        account = ResourceAccount(100, interval=10)
+        monitor = ResourceMonitor(procDir=procDir)
+        monitor.watch(account)
+        monitor.sampleDue()
+        usage = account.getUsage()
+        assert usage["cpuUser"] == 3
+        assert usage["voluntaryCtxSwitches"] == 20
+        assert usage["readBytes"] == 4096
+        # RSS of the group members summed up
+        assert usage["peakRss"] == 2097152
+        assert usage["samples"] == 1
+        assert not usage["finished"]
+        # not due again
+        monitor.sampleDue()
+        assert account.getUsage()["samples"] == 1
+        monitor.unwatch(account)
+        assert account not in monitor.accounts
+    finally:
+        shutil.rmtree(procDir)
+
+
+def testResourceAccountFinish():
+    account = ResourceAccount(os.getpid())
+    account.sample([os.getpid()])
+    sampled = account.getUsage()
+    assert sampled["peakRss"] > 0
+    rusage = resource.getrusage(resource.RUSAGE_SELF)
+    account.finish(rusage)
+    usage = account.getUsage()
+    assert usage["finished"]
+    # never below the sampled numbers
+    for name in ("cpuUser", "cpuSystem", "voluntaryCtxSwitches", "peakRss"):
+        assert usage[name] >= sampled[name]
+    assert usage["peakRss"] >= rusage.ru_maxrss * 1024
+    assert "peak RSS" in formatUsage(usage)
@@ -9,13 +9,17 @@ from builtins import range
 
 import os
 import sys
+import errno
+import socket
 import py.test
+from mock import Mock, patch
 
 from fdtcplib.utils.utils import getHostName
 from fdtcplib.utils.utils import getDateTime
 from fdtcplib.utils.utils import getUserName
 from fdtcplib.utils.utils import getRandomString
 from fdtcplib.utils.utils import getOpenFilesList
+from fdtcplib.utils.utils import isPortBindable
 
 
 def setup_module():
@@ -65,3 +69,23 @@ def testGetOpenFilesList():
     numFiles, filesList = getOpenFilesList()
     assert numFiles == 0
     os.remove(fileName)
+
+
+def testIsPortBindableBindErrors():
+    def getSocketFactory(errors):
+        """ socket.socket replacement, bind() fails with errors[family] """
+        def factory(family, sockType):
+            sock = Mock()
+            if family in errors:
+                sock.bind.side_effect = socket.error(errors[family], os.strerror(errors[family]))
+            return sock
+        return factory
+
+    # no IPv6 address on the host, the family is skipped
+    with patch("socket.socket", getSocketFactory({socket.AF_INET6: errno.EADDRNOTAVAIL})):
+        assert isPortBindable(54321)
+    with patch("socket.socket", getSocketFactory({socket.AF_INET: errno.EADDRINUSE})):
+        assert not isPortBindable(54321)
+    # other failures are not raised, the port is not bindable
+    with patch("socket.socket", getSocketFactory({socket.AF_INET: errno.EINVAL})):
+        assert not isPortBindable(54321)